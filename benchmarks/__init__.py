@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+"""
+The benchmarks of `buildout-component`.
+
+Generate a synthetic components tree and time the phases of `setup`:
+
+    $ python -m benchmarks.runner --components 400 --save-baseline benchmarks/baseline.json
+    $ python -m benchmarks.runner --components 400 --baseline benchmarks/baseline.json
+    $ python -m benchmarks.runner --components 400 --hook-layout module
+
+The `import (<sub-command>)` results are the totals of `python -X importtime`
+for running the sub-command, the interpreter startup included. The `hook
+loading` counts are the hook modules imported and the files opened by a cold
+run, compare the `files` and the `module` hook layouts with them. The
+`memory` counts are the bytes per component kept by the collected and the
+merged configs, measured by `tracemalloc`.
+"""
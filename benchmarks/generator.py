@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import json
+import os
+import random
+import shutil
+from collections import OrderedDict
+
+from buildout_component.bundles import pack_components
+from buildout_component.index import MANIFEST_NAME
+from buildout_component.loaders import HOOKS_DIR_NAME, HOOK_FUNC_NAME, HOOK_FUNC_PREFIX
+from buildout_component.models import Manifest
+
+DEFAULT_COMPONENTS_DIR = os.path.join('buildout', 'components')
+
+HOOK_LAYOUTS = ('files', 'module')
+
+BUNDLE_FILE_NAME = 'components.zip'
+
+HOOK_FILE_HEADER = """# -*- coding: utf-8 -*-
+#
+# Buildout Component Option Hook
+#
+"""
+
+HOOK_FUNC_TEMPLATE = """
+
+def {hook_func_name}(context):
+    config = context.config
+    config['buildout']['eggs'] = ['{component}_egg_{index}']
+    config['buildout']['parts'] = '{component}'
+    config['versions']['{component}_egg_{index}'] = '>=1.{index}'
+    config['{component}']['{option}_setting'] = context.defaults.get('{option}', '')
+
+    return {value!r}
+"""
+
+
+class ComponentTreeGenerator(object):
+    """
+    Generate a synthetic components tree, with the same layout as the
+    `create` sub-command: `<id>/manifest.json` and `<id>/hooks/<option>.py`.
+    With the `module` hook layout, the hooks of a component are the
+    `setup_<option>` functions of one `<id>/hooks/__init__.py` instead.
+    With `bundle`, the components are packed into one zip bundle.
+
+    The components are spread over `depth` levels, every component of a level
+    depends on `fan_in` components of the previous level.
+    """
+
+    def __init__(self, components=100, options=5, depth=4, fan_in=2, value_size=32, seed=0, hook_layout='files',
+                 bundle=False):
+        self.components = components
+        self.options = options
+        self.depth = max(1, depth)
+        self.fan_in = fan_in
+        self.value_size = value_size
+        self.seed = seed
+        self.hook_layout = hook_layout
+        self.bundle = bundle
+
+    @property
+    def params(self):
+        return OrderedDict([
+            ('components', self.components),
+            ('options', self.options),
+            ('depth', self.depth),
+            ('fan_in', self.fan_in),
+            ('value_size', self.value_size),
+            ('seed', self.seed),
+            ('hook_layout', self.hook_layout),
+            ('bundle', self.bundle),
+        ])
+
+    def get_component_id(self, index):
+        return 'c{index:05d}'.format(index=index)
+
+    def build_manifests(self):
+        rand = random.Random(self.seed)
+        levels = [[] for _ in range(self.depth)]
+        manifests = []
+
+        for index in range(self.components):
+            _id = self.get_component_id(index)
+            level = index * self.depth // max(1, self.components)
+            dependencies = []
+            if level > 0 and levels[level - 1]:
+                candidates = levels[level - 1]
+                dependencies = rand.sample(candidates, min(self.fan_in, len(candidates)))
+            levels[level].append(_id)
+
+            options = ['option{index}'.format(index=i) for i in range(self.options)]
+
+            manifest = Manifest()
+            manifest.id = _id
+            manifest.title = 'Component {id}'.format(id=_id)
+            manifest.section = _id
+            manifest.options = options
+            manifest.defaults = OrderedDict((option, 'default_{option}'.format(option=option)) for option in options)
+            manifest.disabled = False
+            manifest.dependencies = dependencies
+            manifests.append(manifest)
+
+        return manifests
+
+    def render_hook(self, manifest, index, option, hook_func_name):
+        return HOOK_FUNC_TEMPLATE.format(
+            hook_func_name=hook_func_name,
+            component=manifest.id,
+            option=option,
+            index=index,
+            value='v' * self.value_size,
+        )
+
+    def generate(self, project_root, components_dir=DEFAULT_COMPONENTS_DIR):
+        components_dir = os.path.join(project_root, components_dir)
+        os.makedirs(components_dir, exist_ok=True)
+
+        manifests = self.build_manifests()
+        for manifest in manifests:
+            component_dir = os.path.join(components_dir, manifest.id)
+            hooks_dir = os.path.join(component_dir, HOOKS_DIR_NAME)
+            os.makedirs(hooks_dir, exist_ok=True)
+
+            with open(os.path.join(component_dir, MANIFEST_NAME), "w") as fp:
+                fp.write(json.dumps(manifest.serialize(), indent=4))
+
+            if self.hook_layout == 'module':
+                with open(os.path.join(hooks_dir, '__init__.py'), "w") as fp:
+                    fp.write(HOOK_FILE_HEADER)
+                    for index, option in enumerate(manifest.options):
+                        fp.write(self.render_hook(manifest, index, option, HOOK_FUNC_PREFIX + option))
+                continue
+
+            for index, option in enumerate(manifest.options):
+                with open(os.path.join(hooks_dir, '{option}.py'.format(option=option)), "w") as fp:
+                    fp.write(HOOK_FILE_HEADER)
+                    fp.write(self.render_hook(manifest, index, option, HOOK_FUNC_NAME))
+
+        if self.bundle:
+            for dir_name in pack_components(components_dir, os.path.join(components_dir, BUNDLE_FILE_NAME)):
+                shutil.rmtree(os.path.join(components_dir, dir_name))
+
+        return components_dir
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from buildout_component.builders import Builder, Project
+from buildout_component.cli import Command
+from buildout_component.contexts import Context
+from buildout_component.executors import get_executor
+from buildout_component.models import FinalRootConfig
+
+from benchmarks.generator import ComponentTreeGenerator, HOOK_LAYOUTS
+
+# The sub-commands measured by `python -X importtime`, `create` is interactive.
+IMPORTTIME_COMMANDS = (
+    ('show-options', ['show-options', 'c00000']),
+    ('index', ['index']),
+    ('setup', ['setup', '--force']),
+)
+
+_opened_files = None
+
+
+def _count_opened_file(event, args):
+    if _opened_files is not None and event == 'open':
+        _opened_files.append(args[0])
+
+
+class Benchmark(object):
+    """
+    Time the phases of `setup` on a generated components tree.
+    """
+
+    def __init__(self, project_root, repeat=5):
+        self.project_root = project_root
+        self.repeat = repeat
+        self.results = OrderedDict()
+        self.counts = OrderedDict()
+
+    def get_command(self, *args):
+        command = Command()
+        command.parse_args(['setup', '--project-root', self.project_root] + list(args))
+        return command
+
+    def measure(self, name, func, setup=None):
+        timings = []
+        for _ in range(self.repeat):
+            state = setup() if setup is not None else None
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                func(state)
+            timings.append(time.perf_counter() - start)
+
+        self.results[name] = OrderedDict([
+            ('min', min(timings)),
+            ('median', statistics.median(timings)),
+            ('repeat', len(timings)),
+        ])
+        return self.results[name]
+
+    def _prepare_command(self, collect=False):
+        command = self.get_command('--force')
+        command.context = Context()
+        command._scan_components()
+        command.hook_loader = command._get_hook_loader()
+        command.result_cache = None
+        command.hook_cache = None
+        command.defaults = command._get_defaults()
+        python_sys_path = os.path.dirname(os.path.abspath(command.options.components_dir))
+        if python_sys_path not in sys.path:
+            sys.path.insert(0, python_sys_path)
+        command._resolve_dependencies()
+        if collect:
+            self._collect(command)
+        return command
+
+    def _collect(self, command):
+        executor = get_executor(command._setup_manifest)
+        executor.execute(command.dependency_graph, command.context.collected)
+
+    def _merge(self, command):
+        final_root_config = FinalRootConfig()
+        for collected_data in command.context.collected.values():
+            final_root_config.merge(collected_data.get('config'))
+        return final_root_config
+
+    def _clear_index(self):
+        command = self.get_command()
+        shutil.rmtree(command.options.cache_dir, ignore_errors=True)
+        return command
+
+    def run(self):
+        self.measure('scan (no index)', lambda command: command._scan_components(), setup=self._clear_index)
+        self.measure('scan (indexed)', lambda command: command._scan_components(), setup=self.get_command)
+        self.measure('defaults', lambda command: command._get_defaults(), setup=self._prepare_command)
+        self.measure('setup_manifest', self._collect, setup=self._prepare_command)
+        self.measure('merge', self._merge, setup=lambda: self._prepare_command(collect=True))
+        self.measure(
+            'render',
+            lambda config: config.render(),
+            setup=lambda: self._merge(self._prepare_command(collect=True))
+        )
+        self.measure('setup', self._run_setup_process)
+        self.measure('build (warm)', self._build, setup=self._get_warm_builder)
+        for name, args in IMPORTTIME_COMMANDS:
+            self.measure_importtime('import ({name})'.format(name=name), args)
+        self.count_hook_loading()
+        self.measure_memory()
+        return self.results
+
+    def measure_memory(self):
+        """
+        Record the memory kept per component by `tracemalloc`: the manifests,
+        the collected configs and options, and the merged config.
+        """
+        import tracemalloc
+
+        # Load the hooks and warm the caches first, they are not kept per build.
+        self._merge(self._prepare_command(collect=True))
+
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            command = self._prepare_command(collect=True)
+            collected, _ = tracemalloc.get_traced_memory()
+            final_root_config = self._merge(command)
+            merged, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        components = max(1, len(command.all_component_list))
+        self.counts['memory (bytes per component)'] = OrderedDict([
+            ('collected', (collected - before) // components),
+            ('merged', (merged - collected) // components),
+            ('peak', (peak - before) // components),
+        ])
+        del final_root_config
+        return self.counts['memory (bytes per component)']
+
+    def count_hook_loading(self):
+        """
+        Count the imported hook modules and the opened files of a cold
+        `setup_manifest` run. The `os.stat` calls are not audited, the import
+        system stats about every file it opens.
+        """
+        global _opened_files
+
+        command = self._prepare_command()
+        prefix = command.hook_loader.module_name_prefix + '.'
+        for module_name in [name for name in sys.modules if name.startswith(prefix)]:
+            del sys.modules[module_name]
+        importlib.invalidate_caches()
+
+        sys.addaudithook(_count_opened_file)
+        _opened_files = []
+        try:
+            self._collect(command)
+        finally:
+            opened_files, _opened_files = _opened_files, None
+
+        self.counts['hook loading'] = OrderedDict([
+            ('modules', sum(1 for name in sys.modules if name.startswith(prefix))),
+            ('opened_files', len(opened_files)),
+        ])
+        return self.counts['hook loading']
+
+    def _run_cli(self, args, stderr=None, python_args=()):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+        return subprocess.run(
+            [sys.executable] + list(python_args) + ['-m', 'buildout_component.cli'] + list(args) +
+            ['--project-root', self.project_root],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            universal_newlines=True,
+            check=True,
+        )
+
+    def _get_warm_builder(self):
+        builder = Builder()
+        self._build(builder)
+        return builder
+
+    def _build(self, builder):
+        return builder.build(Project(self.project_root, use_state=False))
+
+    def _run_setup_process(self, state=None):
+        self._run_cli(['setup', '--force'])
+
+    def measure_importtime(self, name, args):
+        """
+        Record the total of the `python -X importtime` self times of a
+        sub-command, the interpreter startup included.
+        """
+        timings = []
+        for _ in range(self.repeat):
+            process = self._run_cli(args, stderr=subprocess.PIPE, python_args=['-X', 'importtime'])
+            total = 0
+            for line in process.stderr.splitlines():
+                if not line.startswith('import time:'):
+                    continue
+                self_time = line[len('import time:'):].split('|')[0].strip()
+                if self_time.isdigit():
+                    total += int(self_time)
+            timings.append(total / 1000000)
+
+        self.results[name] = OrderedDict([
+            ('min', min(timings)),
+            ('median', statistics.median(timings)),
+            ('repeat', len(timings)),
+        ])
+        return self.results[name]
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the results against the baseline, return the names of regressions.
+    """
+    regressions = []
+    line = '{name:<20} {current:>14} {baseline:>14} {ratio:>8}'
+    print(line.format(name='BENCHMARK', current='MEDIAN (ms)', baseline='BASELINE (ms)', ratio='RATIO'))
+    for name, result in results.items():
+        base = baseline.get(name, None)
+        current = result['median'] * 1000
+        if base is None:
+            print(line.format(name=name, current='{:.3f}'.format(current), baseline='-', ratio='-'))
+            continue
+        base = base['median'] * 1000
+        ratio = current / base if base else float('inf')
+        if ratio > 1 + threshold:
+            regressions.append(name)
+        print(line.format(
+            name=name,
+            current='{:.3f}'.format(current),
+            baseline='{:.3f}'.format(base),
+            ratio='{:.2f}x'.format(ratio),
+        ))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark buildout-component on a generated components tree.")
+    parser.add_argument('--components', type=int, default=100, help="default=%(default)s")
+    parser.add_argument('--options', type=int, default=5, help="The options per component. default=%(default)s")
+    parser.add_argument('--depth', type=int, default=4, help="The dependency depth. default=%(default)s")
+    parser.add_argument('--fan-in', type=int, default=2, help="The dependencies per component. default=%(default)s")
+    parser.add_argument('--value-size', type=int, default=32, help="The size of option values. default=%(default)s")
+    parser.add_argument('--seed', type=int, default=0, help="default=%(default)s")
+    parser.add_argument(
+        '--hook-layout',
+        choices=HOOK_LAYOUTS,
+        default='files',
+        help="A file per option hook, or a hook module per component. default=%(default)s",
+    )
+    parser.add_argument(
+        '--bundle',
+        default=False,
+        action='store_true',
+        help="Pack the components into one zip bundle.",
+    )
+    parser.add_argument('--repeat', type=int, default=5, help="default=%(default)s")
+    parser.add_argument('--project-root', default=None, help="Keep the generated project in the directory.")
+    parser.add_argument('--output', default=None, help="Write the results JSON to the file.")
+    parser.add_argument('--baseline', default=None, help="Compare the results with the baseline JSON.")
+    parser.add_argument('--save-baseline', default=None, help="Write the results as the baseline JSON.")
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help="The slowdown ratio reported as regression. default=%(default)s",
+    )
+    options = parser.parse_args(args)
+
+    generator = ComponentTreeGenerator(
+        components=options.components,
+        options=options.options,
+        depth=options.depth,
+        fan_in=options.fan_in,
+        value_size=options.value_size,
+        seed=options.seed,
+        hook_layout=options.hook_layout,
+        bundle=options.bundle,
+    )
+
+    project_root = options.project_root or tempfile.mkdtemp(prefix='buildout-component-bench-')
+    try:
+        generator.generate(project_root)
+        benchmark = Benchmark(project_root, repeat=options.repeat)
+        results = benchmark.run()
+    finally:
+        if not options.project_root:
+            shutil.rmtree(project_root, ignore_errors=True)
+
+    data = OrderedDict([
+        ('params', generator.params),
+        ('python', platform.python_version()),
+        ('results', results),
+        ('counts', benchmark.counts),
+    ])
+    for path in (options.output, options.save_baseline):
+        if path:
+            with open(path, 'w') as fp:
+                json.dump(data, fp, indent=2)
+
+    baseline = {}
+    if options.baseline:
+        with open(options.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        if baseline.get('params') != data['params']:
+            sys.stderr.write("The baseline was measured with different parameters: {params}\n".format(
+                params=baseline.get('params')
+            ))
+        baseline = baseline.get('results', {})
+
+    regressions = compare(results, baseline, options.threshold)
+    for name, counts in benchmark.counts.items():
+        print('{name:<30} {counts}'.format(
+            name=name,
+            counts=', '.join('{event}={count}'.format(event=event, count=count) for event, count in counts.items()),
+        ))
+    if regressions:
+        sys.stderr.write("Regressions: {names}\n".format(names=', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,638 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+"""
+The library API of `buildout-component`:
+
+    from buildout_component.builders import Builder, Project
+
+    builder = Builder()
+    result = builder.build(Project('/path/to/project', defaults={'db.port': '5432'}))
+    result.options.get('db.port')
+    result.render()
+    result.write()
+
+A `Builder` keeps the parsed manifests and the loaded hooks between builds.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from buildout_component.bundles import close_bundles
+from buildout_component.caches import HookCache
+from buildout_component.contexts import Context
+from buildout_component.errors import DependencyError, HookError, HookTimeoutError
+from buildout_component.executors import AsyncioExecutor, LazyExecutor, get_executor, run_coroutine
+from buildout_component.graph import DependencyGraph
+from buildout_component.index import ComponentIndex, load_manifest
+from buildout_component.loaders import IsolatedHookLoader, HOOKS_DIR_NAME
+from buildout_component.models import Options, ConfigSection, RootConfig, FinalRootConfig
+from buildout_component.profiling import Profiler
+from buildout_component.renderers import COMPONENT_SECTION_NAME_IN_CONFIG
+from buildout_component.stores import OptionStore, get_state_path
+from buildout_component.tracking import ComponentTracker
+from buildout_component.utils import atomic_write, is_same_file
+
+DEFAULT_COMPONENTS_DIR = 'buildout/components/'
+DEFAULT_OUTPUT_FILE = 'buildout.cfg'
+DEFAULT_CACHE_DIR = '.buildout_component/'
+DEFAULT_PROG = 'buildout-component'
+
+LEVEL_ERROR = 'error'
+LEVEL_WARNING = 'warning'
+
+# The lines that change on every run, they are ignored when comparing outputs.
+VOLATILE_LINE_PATTERN = re.compile(r'^(# Create Time: |create_time = ).*$', re.MULTILINE)
+
+
+def get_defaults(manifests, previous=None, defaults=None):
+    """
+    Return the defaults of the options: the defaults of the manifests,
+    overridden by the `previous` options and then by the `defaults` of
+    `<component>.<name>` keys.
+    """
+    results = Options()
+
+    for manifest in manifests:
+        for key, value in manifest.defaults.items():
+            results.put(manifest.id, key, value)
+
+    if previous is not None:
+        for manifest_id, options in previous.group_by.items():
+            for key, value in options.items():
+                results.put(manifest_id, key, value)
+
+    for key, value in (defaults or {}).items():
+        results[key] = value
+
+    return results
+
+
+def merge_collected(collected):
+    """
+    Merge the collected configs and options of components, return the
+    `(FinalRootConfig, Options)`.
+    """
+    final_root_config = FinalRootConfig()
+    final_options = Options()
+
+    for manifest_id, collected_data in collected.items():
+        final_root_config.merge(collected_data.get('config'))
+
+        for key, value in collected_data.get('options', {}).items():
+            final_options.put(manifest_id, key, value)
+
+    return final_root_config, final_options
+
+
+def apply_extends(config, pre_extends=None, post_extends=None):
+    # The `[buildout]` section is always rendered, create it even when no
+    # component writes to it.
+    buildout_config = config['buildout']
+    if not pre_extends and not post_extends:
+        return
+
+    extends = []
+    if pre_extends:
+        extends.extend(pre_extends)
+    extends.extend(buildout_config.get('extends', []))
+    if post_extends:
+        extends.extend(post_extends)
+    buildout_config._data['extends'] = extends
+
+
+def create_component_section(state_path, create_time):
+    section = ConfigSection()
+    section['state'] = os.path.basename(state_path)
+    section['create_time'] = repr(str(create_time))
+    return section
+
+
+def iter_output(config, prog, create_time):
+    yield "# The buildout component configure file.\n"
+    yield "# *** DO NOT EDIT THIS FILE, IT WILL GENERATE BY `{prog}`\n".format(prog=prog)
+    yield "# Create Time: {create_time}\n".format(create_time=create_time)
+    yield from config.iter_render()
+
+
+def write_output(output_file, config, prog, create_time):
+    """
+    Stream the rendered config to the output file, return False if only the
+    volatile lines would change, the file is kept then.
+    """
+    unchanged = []
+
+    def keep_existing(path, temp_path):
+        unchanged.append(is_same_file(path, temp_path, ignore=VOLATILE_LINE_PATTERN))
+        return unchanged[0]
+
+    with atomic_write(output_file, keep_existing=keep_existing) as fp:
+        fp.writelines(iter_output(config, prog, create_time))
+    return not unchanged or not unchanged[0]
+
+
+class Project(object):
+    """
+    The inputs of a build, the relative paths are relative to the
+    `project_root`.
+
+    The `defaults` maps `<component>.<name>` to the option values. With
+    `use_state`, the options saved by the last `write()` are the defaults
+    too, like the `setup` sub-command does.
+    """
+
+    def __init__(self, project_root, components_dir=DEFAULT_COMPONENTS_DIR, output_file=DEFAULT_OUTPUT_FILE,
+                 cache_dir=DEFAULT_CACHE_DIR, defaults=None, include_disabled=False, pre_extends=None,
+                 post_extends=None, use_state=True):
+        self.project_root = os.path.abspath(project_root)
+        self.components_dir = self.get_path(components_dir)
+        self.output_file = self.get_path(output_file)
+        self.cache_dir = self.get_path(cache_dir)
+        self.defaults = OrderedDict(defaults or {})
+        self.include_disabled = include_disabled
+        self.pre_extends = pre_extends
+        self.post_extends = post_extends
+        self.use_state = use_state
+
+    def __repr__(self):
+        return '{class_name}(project_root={project_root})'.format(
+            class_name=self.__class__.__name__,
+            project_root=self.project_root,
+        )
+
+    def get_path(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.project_root, path)
+
+    def get_state_path(self):
+        return get_state_path(self.output_file)
+
+    def get_extends_files(self, extends):
+        import glob
+
+        results = []
+        if extends:
+            if not isinstance(extends, (tuple, list)):
+                extends = [extends]
+            for e in extends:
+                results.extend(glob.glob(os.path.join(self.project_root, e), recursive=False))
+        return results
+
+
+class BuildResult(object):
+    """
+    The config and options built for a project, nothing is written until
+    `write()` is called.
+    """
+
+    def __init__(self, project, manifests, collected, config, options, messages, create_time, prog):
+        self.project = project
+        self.manifests = manifests
+        self.collected = collected
+        self.config = config
+        self.options = options
+        self.messages = messages
+        self.create_time = create_time
+        self.prog = prog
+
+    def __repr__(self):
+        return '{class_name}(project={project}, components={count})'.format(
+            class_name=self.__class__.__name__,
+            project=repr(self.project),
+            count=len(self.manifests),
+        )
+
+    @property
+    def errors(self):
+        return [message for level, message in self.messages if level == LEVEL_ERROR]
+
+    @property
+    def warnings(self):
+        return [message for level, message in self.messages if level == LEVEL_WARNING]
+
+    def iter_render(self):
+        return iter_output(self.config, self.prog, self.create_time)
+
+    def render(self):
+        return ''.join(self.iter_render())
+
+    def write(self):
+        """
+        Save the options to the state file and write the output file, return
+        False if the output file is up to date.
+        """
+        store = OptionStore(self.project.get_state_path())
+        store.save(self.options, OrderedDict(
+            (manifest_id, collected_data.get('config'))
+            for manifest_id, collected_data in self.collected.items()
+        ))
+        return write_output(self.project.output_file, self.config, self.prog, self.create_time)
+
+
+class Builder(object):
+    """
+    Build the buildout configs of projects, one builder serves many builds.
+
+    The parsed manifests and the loaded hooks are cached by the real path of
+    the components directory, and reused while their files do not change.
+    The builder does not change `sys.path` or `sys.modules`, exit, or write
+    to the standard streams: the problems are in the `messages` of the
+    result, or raised.
+
+    The hooks may be coroutine functions. With `hook_concurrency`, the
+    components run as the tasks of one event loop, at most
+    `hook_concurrency` at a time, a component starts when its dependencies
+    are collected. Otherwise every coroutine hook runs on its own loop. The
+    `hook_timeout` (in seconds) limits a coroutine hook.
+
+    With `hook_workers`, the components run in that many worker processes
+    instead, see `workers.HookWorkerPool`. The `hook_timeout` limits every
+    hook then, and the `hook_memory_limit` (in MB) and `hook_cpu_limit` (in
+    seconds) limit the workers. Call `close()` to stop the workers.
+
+    With `lazy`, a component runs when a component depending on it runs, or
+    when a hook reads it by `context.get_collected_option()` or
+    `context.get_collected_config()`, see `executors.LazyExecutor`. It can
+    not be used with `hook_workers`: the hooks in worker processes read the
+    collected dependencies only.
+
+    With `cache_hooks`, the reads and writes of every option hook are
+    recorded in the cache directory of the project, a hook runs again only
+    when its source or a value it read changed, see `tracking`. The hooks in
+    worker processes or on one event loop are not tracked.
+    """
+
+    def __init__(self, jobs=1, prog=DEFAULT_PROG, profiler=None, hook_concurrency=None, hook_timeout=None,
+                 hook_workers=None, hook_memory_limit=None, hook_cpu_limit=None, lazy=False, cache_hooks=False):
+        if lazy and hook_workers:
+            raise ValueError("The lazy evaluation can not be used with the hook workers.")
+
+        self.jobs = jobs
+        self.lazy = lazy
+        self.cache_hooks = cache_hooks
+        self.prog = prog
+        self.hook_concurrency = hook_concurrency
+        self.hook_timeout = hook_timeout
+        self.hook_workers = hook_workers
+        self.hook_memory_limit = hook_memory_limit
+        self.hook_cpu_limit = hook_cpu_limit
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+        self.component_indexes = {}
+        self.hook_loaders = {}
+        self.worker_pools = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            worker_pools, self.worker_pools = self.worker_pools, {}
+        for worker_pool in worker_pools.values():
+            worker_pool.close()
+
+    def _get_cached(self, cache, components_dir, factory):
+        key = os.path.realpath(components_dir)
+        with self._lock:
+            cached = cache.get(key, None)
+            if cached is None:
+                cached = cache[key] = factory(key)
+        return cached
+
+    def get_component_index(self, components_dir):
+        """
+        Return the in-memory `(ComponentIndex, lock)` of the components
+        directory.
+        """
+        return self._get_cached(
+            self.component_indexes,
+            components_dir,
+            lambda path: (ComponentIndex(path, None), threading.Lock()),
+        )
+
+    def get_hook_loader(self, components_dir):
+        return self._get_cached(self.hook_loaders, components_dir, IsolatedHookLoader)
+
+    def get_worker_pool(self, hook_loader):
+        from buildout_component.workers import HookWorkerPool
+
+        return self._get_cached(
+            self.worker_pools,
+            hook_loader.components_dir,
+            lambda path: HookWorkerPool(
+                path,
+                processes=self.hook_workers,
+                cache_dir=hook_loader.cache_dir,
+                timeout=self.hook_timeout,
+                memory_limit=self.hook_memory_limit,
+                cpu_limit=self.hook_cpu_limit,
+                profiler=self.profiler,
+            ),
+        )
+
+    def scan(self, project, report):
+        index, lock = self.get_component_index(project.components_dir)
+        with lock:
+            entries = index.scan()
+
+        manifests = []
+        for dir_name, entry in entries:
+            if entry['manifest'].get('disabled', False) and not project.include_disabled:
+                report(LEVEL_WARNING, "Component `{id}` is disabled.".format(id=entry['manifest']['id']))
+                continue
+            manifests.append(load_manifest(project.components_dir, dir_name, entry, project.cache_dir))
+        return manifests
+
+    def load_previous_options(self, project):
+        store = OptionStore(project.get_state_path())
+        if not store.exists():
+            return None
+        return store.load()
+
+    def default_option(self, manifest, name):
+        return manifest.defaults.get(name, None)
+
+    def load_component_hooks(self, manifest, hook_loader, report):
+        """
+        Import the component hook module once for all the options, return
+        None if the component has none or it can not be imported.
+        """
+        hook_name = '{component}.{hooks}'.format(component=manifest.id, hooks=HOOKS_DIR_NAME)
+        try:
+            with self.profiler.span(hook_name, 'import'):
+                return hook_loader.load_component(manifest)
+        except ImportError as exc:
+            report(LEVEL_ERROR, "Import `{hook_name}` fail: {exc}".format(hook_name=hook_name, exc=exc))
+            return None
+
+    def _call_hook(self, manifest, option_name, context, hook_loader, report, component_hooks=None):
+        """
+        Call the hook of the option, a hook that can not be imported falls
+        back to the default of the option. The awaitable of a coroutine hook
+        is returned as it is.
+        """
+        try:
+            if manifest.hooks_dir_existed is False and component_hooks is None:
+                raise ImportError()
+
+            hook_name = '{component}.{option_name}'.format(component=manifest.id, option_name=option_name)
+            with self.profiler.span(hook_name, 'import'):
+                handler = hook_loader.get_handler(manifest, option_name, component_hooks)
+            if not handler:
+                raise ImportError()
+
+            if inspect.iscoroutinefunction(handler):
+                return handler(context)
+            with self.profiler.capture(hook_name, 'hook'):
+                return handler(context)
+
+        except ImportError as exc:
+            report(LEVEL_ERROR, "Import `{component}.{option_name} fail: {exc}".format(
+                component=manifest.id,
+                option_name=option_name,
+                exc=exc
+            ))
+            return self.default_option(manifest, option_name)
+        except (DependencyError, HookError):
+            # A cycle of the lazy reads is reported once by the caller, the
+            # failed hook of a lazily read component is reported already.
+            raise
+        except Exception as exc:
+            raise self._report_hook_error(manifest, option_name, exc, report) from exc
+        finally:
+            hook_loader.cleanup(manifest, option_name)
+
+    def _report_hook_error(self, manifest, option_name, exc, report, error_class=HookError):
+        """
+        Report the failed hook, return the `HookError` to raise.
+        """
+        error = error_class(
+            manifest.id,
+            option_name,
+            exc or 'timed out after {timeout} seconds'.format(timeout=self.hook_timeout),
+        )
+        report(LEVEL_ERROR, str(error))
+        return error
+
+    async def _await_hook(self, manifest, option_name, awaitable, report):
+        hook_name = '{component}.{option_name}'.format(component=manifest.id, option_name=option_name)
+        try:
+            with self.profiler.span(hook_name, 'hook'):
+                return await asyncio.wait_for(awaitable, self.hook_timeout)
+        except asyncio.TimeoutError as exc:
+            raise self._report_hook_error(manifest, option_name, None, report, HookTimeoutError) from exc
+        except (DependencyError, HookError):
+            raise
+        except Exception as exc:
+            raise self._report_hook_error(manifest, option_name, exc, report) from exc
+
+    def _put_option(self, options, option_name, result):
+        if not isinstance(result, dict):
+            result = {option_name: result}
+
+        options.update(result)
+
+    def run_option(self, manifest, option_name, context, hook_loader, report, component_hooks=None):
+        """
+        Run the hook of the option, a coroutine hook runs on its own event
+        loop.
+        """
+        result = self._call_hook(manifest, option_name, context, hook_loader, report, component_hooks)
+        if inspect.isawaitable(result):
+            result = self._run_coroutine(self._await_hook(manifest, option_name, result, report))
+        return result
+
+    def _run_coroutine(self, coroutine):
+        # A lazy read from a coroutine hook runs the hooks of another
+        # component, the running loop can not be nested.
+        return run_coroutine(coroutine)
+
+    def collect_options(self, manifest, context, hook_loader, report, tracker=None):
+        """
+        Run the option hooks of the component, the `tracker` reuses the
+        records of the unchanged hooks.
+        """
+        options = OrderedDict()
+        component_hooks = self.load_component_hooks(manifest, hook_loader, report)
+
+        for option_name in manifest.options:
+            if tracker is None:
+                result = self.run_option(manifest, option_name, context, hook_loader, report, component_hooks)
+            else:
+                result = tracker.run(option_name, context, functools.partial(
+                    self.run_option, manifest, option_name, context, hook_loader, report, component_hooks))
+            self._put_option(options, option_name, result)
+
+        hook_loader.cleanup(manifest)
+
+        return options
+
+    async def collect_options_async(self, manifest, context, hook_loader, report):
+        """
+        Like `collect_options`, the coroutine hooks are awaited on the running
+        event loop. The hooks of one component still run one by one.
+        """
+        options = OrderedDict()
+        component_hooks = self.load_component_hooks(manifest, hook_loader, report)
+
+        for option_name in manifest.options:
+            result = self._call_hook(manifest, option_name, context, hook_loader, report, component_hooks)
+            if inspect.isawaitable(result):
+                result = await self._await_hook(manifest, option_name, result, report)
+            self._put_option(options, option_name, result)
+
+        hook_loader.cleanup(manifest)
+
+        return options
+
+    def _fork_context(self, manifest, context, defaults):
+        return context.fork(
+            manifest=manifest,
+            config=RootConfig(manifest),
+            defaults=defaults,
+        )
+
+    def _get_collected(self, manifest, context, options):
+        # Set the options as default to manifest's section.
+        for key, value in options.items():
+            context.config[manifest.section].setdefault(key, value)
+
+        return OrderedDict({
+            'config': context.config,
+            'options': options
+        })
+
+    def setup_manifest(self, manifest, context, hook_loader, defaults, report, dependencies=None,
+                       hook_cache=None):
+        """
+        Run the hooks of the component in a forked context, return the
+        collected `config` and `options`.
+
+        With `hook_workers`, the hooks run in a worker process, they can read
+        the collected data of the `dependencies` ids only (all the collected
+        data if it is None). Otherwise the hooks are tracked with the
+        `hook_cache`, unless the component is not `cacheable`.
+        """
+        if self.hook_workers:
+            collected = context.collected
+            if dependencies is not None:
+                collected = OrderedDict((i, collected[i]) for i in dependencies if i in collected)
+            return self.get_worker_pool(hook_loader).setup_manifest(manifest, defaults, collected, report)
+
+        context = self._fork_context(manifest, context, defaults)
+        if hook_cache is None or not manifest.cacheable:
+            options = self.collect_options(manifest, context, hook_loader, report)
+            return self._get_collected(manifest, context, options)
+
+        tracker = ComponentTracker(hook_cache, manifest)
+        tracker.attach(context)
+        try:
+            options = self.collect_options(manifest, context, hook_loader, report, tracker)
+        finally:
+            tracker.detach(context)
+        try:
+            tracker.save()
+        except OSError as exc:
+            report(LEVEL_WARNING, "Save the `{component}` hook records fail: {exc}".format(
+                component=manifest.id,
+                exc=exc,
+            ))
+        return self._get_collected(manifest, context, options)
+
+    async def setup_manifest_async(self, manifest, context, hook_loader, defaults, report):
+        context = self._fork_context(manifest, context, defaults)
+        options = await self.collect_options_async(manifest, context, hook_loader, report)
+        return self._get_collected(manifest, context, options)
+
+    def get_executor(self, setup, setup_async, context=None, manifest_ids=None):
+        """
+        Return the executor of the components, the lazy executor resolves the
+        reads of the `context` and runs the `manifest_ids` to begin with.
+        """
+        if self.lazy:
+            executor = LazyExecutor(setup, manifest_ids)
+            if context is not None:
+                context.resolver = executor.resolve
+            return executor
+        if self.hook_workers:
+            return get_executor(setup, jobs=max(self.jobs, self.hook_workers))
+        if self.hook_concurrency:
+            return AsyncioExecutor(setup_async, self.hook_concurrency)
+        return get_executor(setup, jobs=self.jobs)
+
+    def build(self, project, components=None):
+        """
+        Build the project, or the `components` ids only: with their
+        dependencies, and with the components they read if `lazy`. The
+        result of a partial build has only these components.
+        """
+        messages = []
+
+        def report(level, message):
+            messages.append((level, message))
+
+        manifests = self.scan(project, report)
+
+        graph = DependencyGraph(OrderedDict((manifest.id, manifest) for manifest in manifests))
+        graph.topological_order()
+        for path in graph.missing_dependencies:
+            report(LEVEL_WARNING, "Missing dependency: {path}".format(path=' -> '.join(path)))
+        if components is not None and not self.lazy:
+            graph = DependencyGraph(OrderedDict(
+                (manifest_id, graph.manifests[manifest_id]) for manifest_id in graph.get_closure(components)
+            ))
+
+        previous = self.load_previous_options(project) if project.use_state else None
+        defaults = get_defaults(manifests, previous, project.defaults).group_by
+        hook_loader = self.get_hook_loader(project.components_dir)
+        hook_cache = HookCache(project.cache_dir, hook_loader) if self.cache_hooks else None
+
+        context = Context()
+
+        def setup(manifest):
+            # Only the workers need the dependencies of the component.
+            dependencies = graph.get_closure(manifest.dependencies) if self.hook_workers else None
+            return self.setup_manifest(
+                manifest, context, hook_loader, defaults.get(manifest.id, {}), report, dependencies, hook_cache,
+            )
+
+        async def setup_async(manifest):
+            return await self.setup_manifest_async(
+                manifest, context, hook_loader, defaults.get(manifest.id, {}), report)
+
+        try:
+            self.get_executor(setup, setup_async, context, components).execute(graph, context.collected)
+        finally:
+            # The builder serves many builds, the bundles are not kept open between them.
+            close_bundles()
+
+        config, options = merge_collected(context.collected)
+        apply_extends(
+            config,
+            project.get_extends_files(project.pre_extends),
+            project.get_extends_files(project.post_extends),
+        )
+
+        create_time = datetime.utcnow()
+        config[COMPONENT_SECTION_NAME_IN_CONFIG] = create_component_section(project.get_state_path(), create_time)
+
+        return BuildResult(
+            project=project,
+            manifests=manifests,
+            collected=context.collected,
+            config=config,
+            options=options,
+            messages=messages,
+            create_time=create_time,
+            prog=self.prog,
+        )
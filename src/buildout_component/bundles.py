@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+"""
+The components packed in zip bundles.
+
+A bundle is a `.zip` file in the components directory, its top level
+directories are components. The files of a bundled component are addressed
+by the paths through the bundle, as `zipimport` does:
+`buildout/components/shared.zip/db/manifest.json`.
+"""
+import errno
+import os
+import threading
+import zipfile
+import zlib
+
+from buildout_component.utils import atomic_write
+
+BUNDLE_SUFFIX = '.zip'
+RESOURCES_DIR_NAME = 'bundles'
+
+_bundles = {}
+_lock = threading.Lock()
+
+
+def is_bundle_name(name):
+    return name.endswith(BUNDLE_SUFFIX)
+
+
+def split_bundle_path(path):
+    """
+    Return the `(bundle_path, member_name)` of a path through a bundle, or
+    `(None, path)` of another path.
+    """
+    marker = BUNDLE_SUFFIX + os.sep
+    index = path.find(marker)
+    while index != -1:
+        bundle_path = path[:index + len(BUNDLE_SUFFIX)]
+        if os.path.isfile(bundle_path):
+            return bundle_path, path[index + len(marker):].replace(os.sep, '/')
+        index = path.find(marker, index + 1)
+    return None, path
+
+
+class ComponentBundle(object):
+    """
+    The opened bundle, the member names are read once from the central
+    directory of the zip file. The file is opened again by a read after
+    `close()`.
+    """
+
+    def __init__(self, path, stamp):
+        self.path = path
+        self.stamp = stamp
+        self.zip_file = zipfile.ZipFile(path)
+        self.infos = dict((info.filename, info) for info in self.zip_file.infolist())
+        # The names in every directory, the directories without entries too.
+        self.dirs = {'': set()}
+        for name in self.infos:
+            parts = name.rstrip('/').split('/')
+            for i in range(len(parts)):
+                self.dirs.setdefault('/'.join(parts[:i]), set()).add(parts[i])
+            if name.endswith('/'):
+                self.dirs.setdefault(name.rstrip('/'), set())
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '{class_name}(path={path})'.format(class_name=self.__class__.__name__, path=self.path)
+
+    def get_dir_names(self, file_name):
+        """
+        Return the top level directories having the file, sorted.
+        """
+        suffix = '/' + file_name
+        return sorted(
+            name[:-len(suffix)] for name in self.infos
+            if name.endswith(suffix) and name.count('/') == 1
+        )
+
+    def exists(self, name):
+        return name in self.infos or name.rstrip('/') in self.dirs
+
+    def is_dir(self, name):
+        return name.rstrip('/') in self.dirs
+
+    def listdir(self, name):
+        return sorted(self.dirs.get(name.rstrip('/'), ()))
+
+    def read(self, name):
+        if name not in self.infos:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), os.path.join(self.path, name))
+        with self._lock:
+            if self.zip_file is None:
+                self.zip_file = zipfile.ZipFile(self.path)
+            return self.zip_file.read(name)
+
+    def close(self):
+        with self._lock:
+            if self.zip_file is not None:
+                self.zip_file.close()
+                self.zip_file = None
+
+
+def get_bundle(path):
+    """
+    Return the `ComponentBundle` of the path, it is opened again when the file
+    changed. A file that is not a zip file raises `OSError`.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    key = os.path.abspath(path)
+    with _lock:
+        bundle = _bundles.get(key, None)
+        if bundle is None or bundle.stamp != stamp:
+            try:
+                bundle = _bundles[key] = ComponentBundle(path, stamp)
+            except zipfile.BadZipFile as exc:
+                raise OSError("Bad bundle {path}: {exc}".format(path=path, exc=exc))
+    return bundle
+
+
+def close_bundles():
+    """
+    Close the files of the opened bundles, their member names are kept.
+    """
+    with _lock:
+        bundles = list(_bundles.values())
+    for bundle in bundles:
+        bundle.close()
+
+
+def read_file(path):
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        with open(path, 'rb') as fp:
+            return fp.read()
+    return get_bundle(bundle_path).read(name)
+
+
+def path_exists(path):
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        return os.path.exists(path)
+    return get_bundle(bundle_path).exists(name)
+
+
+def path_is_dir(path):
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        return os.path.isdir(path)
+    return get_bundle(bundle_path).is_dir(name)
+
+
+def get_file_stamp(path):
+    """
+    Return the stamp of the file, which changes with its content, or raise
+    `OSError` if it does not exist.
+    """
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    bundle = get_bundle(bundle_path)
+    info = bundle.infos.get(name, None)
+    if info is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return bundle.stamp, info.CRC, info.file_size
+
+
+def list_dir(path):
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        return os.listdir(path)
+
+    bundle = get_bundle(bundle_path)
+    if not bundle.is_dir(name):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return bundle.listdir(name)
+
+
+def _is_extracted(path, info):
+    try:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return False
+    return len(data) == info.file_size and zlib.crc32(data) == info.CRC
+
+
+def extract_file(path, target_dir):
+    """
+    Return the path of a file out of the bundles: a file or a directory of a
+    bundle is extracted into `target_dir/<bundle name>/`, while the extracted
+    files differ from the bundle. The other paths are returned as they are.
+    """
+    bundle_path, name = split_bundle_path(path)
+    if bundle_path is None:
+        return path
+
+    target_path = os.path.join(target_dir, os.path.basename(bundle_path), *name.split('/'))
+    bundle = get_bundle(bundle_path)
+    if bundle.is_dir(name):
+        prefix = name.rstrip('/') + '/'
+        names = [n for n in bundle.infos if n.startswith(prefix) and not n.endswith('/')]
+        os.makedirs(target_path, exist_ok=True)
+    else:
+        names = [name] if name in bundle.infos else []
+
+    for member_name in names:
+        member_path = os.path.join(target_dir, os.path.basename(bundle_path), *member_name.split('/'))
+        if not _is_extracted(member_path, bundle.infos[member_name]):
+            with atomic_write(member_path, 'wb') as fp:
+                fp.write(bundle.read(member_name))
+    return target_path
+
+
+def pack_components(components_dir, bundle_path, dir_names=None):
+    """
+    Write the component directories into a bundle, all the components of
+    the directory if `dir_names` is None. The compiled files are skipped.
+    Return the packed directory names.
+    """
+    from buildout_component.index import MANIFEST_NAME
+
+    if dir_names is None:
+        dir_names = sorted(
+            name for name in os.listdir(components_dir)
+            if name.isidentifier() and os.path.isfile(os.path.join(components_dir, name, MANIFEST_NAME))
+        )
+
+    def get_arcname(path):
+        return os.path.relpath(path, components_dir).replace(os.sep, '/')
+
+    with atomic_write(bundle_path, 'wb') as fp:
+        with zipfile.ZipFile(fp, 'w', zipfile.ZIP_DEFLATED, strict_timestamps=False) as zip_file:
+            for dir_name in dir_names:
+                for dir_path, sub_dir_names, file_names in os.walk(os.path.join(components_dir, dir_name)):
+                    sub_dir_names[:] = sorted(n for n in sub_dir_names if n != '__pycache__')
+                    # `zipimport` finds the namespace packages by the directory entries.
+                    zip_file.write(dir_path, get_arcname(dir_path))
+                    for file_name in sorted(file_names):
+                        if file_name.endswith(('.pyc', '.pyo')):
+                            continue
+                        path = os.path.join(dir_path, file_name)
+                        zip_file.write(path, get_arcname(path))
+
+    return dir_names
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+
+import buildout_component
+from buildout_component.bundles import list_dir, read_file
+from buildout_component.utils import atomic_write
+
+RESULT_CACHE_DIR_NAME = 'results'
+HOOK_CACHE_DIR_NAME = 'hooks'
+FINGERPRINT_FILE_NAME = 'fingerprints.json'
+
+
+def hash_file(path, hasher=None):
+    hasher = hasher or hashlib.sha1()
+    try:
+        hasher.update(read_file(path))
+    except OSError:
+        hasher.update(b'\0missing\0')
+    return hasher
+
+
+class ResultCache(object):
+    """
+    The persistent cache of the collected data (options and config) of
+    components.
+
+    The key covers the hook sources, the `manifest.json`, the defaults of the
+    component and the options of its declared dependencies. The component
+    whose manifest sets `"cacheable": false` is always executed.
+    """
+
+    def __init__(self, cache_dir, hook_loader):
+        self.cache_dir = os.path.join(cache_dir, RESULT_CACHE_DIR_NAME)
+        self.hook_loader = hook_loader
+
+    def get_key(self, manifest, defaults, collected):
+        hasher = hashlib.sha1()
+        hasher.update(buildout_component.__version__.encode('utf-8'))
+        hasher.update(sys.implementation.cache_tag.encode('utf-8'))
+
+        hash_file(manifest.manifest_path, hasher)
+        for hook_path in self.hook_loader.get_component_hook_paths(manifest):
+            hash_file(hook_path, hasher)
+        for option_name in manifest.options:
+            hasher.update(option_name.encode('utf-8'))
+            hash_file(self.hook_loader.get_hook_path(manifest, option_name), hasher)
+
+        hasher.update(repr(sorted(defaults.items(), key=lambda item: item[0])).encode('utf-8'))
+
+        for dependency in manifest.dependencies:
+            options = collected.get(dependency, {}).get('options', {})
+            hasher.update(dependency.encode('utf-8'))
+            hasher.update(repr(options).encode('utf-8'))
+
+        return hasher.hexdigest()
+
+    def _get_path(self, manifest):
+        return os.path.join(self.cache_dir, '{id}.pickle'.format(id=manifest.id))
+
+    def get(self, manifest, key):
+        path = self._get_path(manifest)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as fp:
+                data = pickle.load(fp)
+        except Exception:
+            return None
+
+        if data.get('key') != key:
+            return None
+
+        collected = data['collected']
+        collected['config'].manifest = manifest
+        return collected
+
+    def set(self, manifest, key, collected):
+        with atomic_write(self._get_path(manifest), 'wb') as fp:
+            pickle.dump({'key': key, 'collected': collected}, fp)
+
+
+class HookCache(object):
+    """
+    The persistent records of the option hooks of components, see
+    `tracking.ComponentTracker`.
+
+    A record is kept with the digest of the hook source, the component hooks
+    module and the `manifest.json`, it is reused while its reads are
+    unchanged. The counts of the hooks `ran` and `reused` are kept for the
+    report.
+    """
+
+    def __init__(self, cache_dir, hook_loader):
+        self.cache_dir = os.path.join(cache_dir, HOOK_CACHE_DIR_NAME)
+        self.hook_loader = hook_loader
+        self.ran = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def count(self, ran=0, reused=0):
+        with self._lock:
+            self.ran += ran
+            self.reused += reused
+
+    def get_component_digest(self, manifest):
+        hasher = hashlib.sha1()
+        hasher.update(buildout_component.__version__.encode('utf-8'))
+        hasher.update(sys.implementation.cache_tag.encode('utf-8'))
+
+        hash_file(manifest.manifest_path, hasher)
+        for hook_path in self.hook_loader.get_component_hook_paths(manifest):
+            hash_file(hook_path, hasher)
+
+        return hasher.hexdigest()
+
+    def get_source(self, component_digest, manifest, option_name):
+        hasher = hashlib.sha1(component_digest.encode('utf-8'))
+        hasher.update(option_name.encode('utf-8'))
+        hash_file(self.hook_loader.get_hook_path(manifest, option_name), hasher)
+        return hasher.hexdigest()
+
+    def _get_path(self, manifest):
+        return os.path.join(self.cache_dir, '{id}.pickle'.format(id=manifest.id))
+
+    def load(self, manifest):
+        try:
+            with open(self._get_path(manifest), 'rb') as fp:
+                records = pickle.load(fp)
+        except Exception:
+            return {}
+        return records if isinstance(records, dict) else {}
+
+    def save(self, manifest, records):
+        try:
+            data = pickle.dumps(records)
+        except Exception:
+            # A result that can not be pickled, the hooks run again.
+            data = pickle.dumps({})
+        with atomic_write(self._get_path(manifest), 'wb') as fp:
+            fp.write(data)
+
+
+class Fingerprint(object):
+    """
+    The digest of the inputs of a `setup` run.
+    """
+
+    def __init__(self):
+        self.hasher = hashlib.sha1()
+        self.update(buildout_component.__version__, sys.implementation.cache_tag)
+
+    def update(self, *values):
+        for value in values:
+            self.hasher.update(repr(value).encode('utf-8'))
+            self.hasher.update(b'\0')
+        return self
+
+    def update_file(self, path):
+        self.update(path)
+        hash_file(path, self.hasher)
+        return self
+
+    def update_dir(self, path, suffix='.py'):
+        try:
+            names = sorted(n for n in list_dir(path) if n.endswith(suffix))
+        except OSError:
+            names = []
+        for name in names:
+            self.update_file(os.path.join(path, name))
+        return self
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+class FingerprintStore(object):
+    """
+    The fingerprints of the last `setup` runs, keyed by the output file.
+    """
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, FINGERPRINT_FILE_NAME)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def is_up_to_date(self, output_file, fingerprint, outputs):
+        data = self._load().get(output_file, None)
+        if not data or data.get('inputs') != fingerprint:
+            return False
+
+        digests = data.get('outputs', {})
+        for path in outputs:
+            if hash_file(path).hexdigest() != digests.get(path, None):
+                return False
+        return True
+
+    def set(self, output_file, fingerprint, outputs):
+        data = self._load()
+        data[output_file] = {
+            'inputs': fingerprint,
+            'outputs': dict((path, hash_file(path).hexdigest()) for path in outputs),
+        }
+        with atomic_write(self.path) as fp:
+            json.dump(data, fp, indent=2)
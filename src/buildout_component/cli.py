@@ -4,25 +4,20 @@
 # 
 # All rights reserved by Cd Chen.
 #
-import base64
-import configparser
-import glob
-import importlib
-import json
 import os
-import pickle
 import re
-import shutil
 import sys
-import textwrap
+import time
 from collections import OrderedDict
-from datetime import datetime
-
-import wrapt as wrapt
 
+# Keep the imports of the module cheap, the sub-commands import what they
+# need only, `show-options` and `--help` run in a few milliseconds.
 from buildout_component.contexts import Context
-from buildout_component.models import Manifest, Options, ConfigList, ConfigSection as _ConfigSection, \
-    BaseRootConfig, RootConfig
+from buildout_component.errors import DependencyError, HookError
+from buildout_component.graph import DependencyGraph
+from buildout_component.profiling import Profiler
+from buildout_component.models import Manifest
+from buildout_component.renderers import COMPONENT_SECTION_NAME_IN_CONFIG
 
 TERMINATOR = "\x1b[0m"
 ERROR = "\x1b[1;31m [ERROR]: "
@@ -31,11 +26,6 @@ INFO = "\x1b[1;34m [INFO]: "
 HINT = "\x1b[3;37m [HINT]: "
 SUCCESS = "\x1b[1;32m [SUCCESS]: "
 
-MANIFEST_NAME = "manifest.json"
-COMPONENT_SECTION_NAME_IN_CONFIG = 'buildout_component'
-
-HOOKS_DIR_NAME = "hooks"
-HOOK_FUNC_NAME = 'setup_option'
 HOOK_FILE_TEMPLATE = """# -*- coding: utf-8 -*-
 #
 # Buildout Component Option Hook
@@ -45,132 +35,7 @@ HOOK_FILE_TEMPLATE = """# -*- coding: utf-8 -*-
 def {hook_func_name}(context):
     pass
 
-""".format(hook_func_name=HOOK_FUNC_NAME)
-
-
-class BaseProxyObject(wrapt.ObjectProxy):
-    _wrapped_class = None
-
-    def __init__(self, wrapped):
-        super().__init__(wrapped)
-
-
-class ConfigSection(BaseProxyObject):
-    _wrapped_class = _ConfigSection
-
-    def _render_key(self, key, value):
-        return key
-
-    def _render_value(self, key, value):
-        if isinstance(value, (tuple, list, ConfigList)):
-            if getattr(value, 'allow_duplicate', False):
-                # If `allow_duplicate` is False.
-                value = list(OrderedDict.fromkeys(value))
-            return [self._render_value(key, v) for v in value]
-
-        return str(value).strip() if value is not None else ''
-
-    def _render_operator(self, key, value):
-        return self.operators.get(key, '=')
-
-    def render(self, padding=4, template=''):
-        items = ['[{section}]'.format(section=self.section)]
-
-        padding = ' ' * padding
-        template = template or '{key} {operator} {values}'
-        value_separator = '\n{padding}'.format(padding=padding)
-
-        for key, value in self.items():
-            key = self._render_key(key, value)
-            operator = self._render_operator(key, value)
-            value = self._render_value(key, value)
-            if isinstance(value, (tuple, list, ConfigList)):
-                values = value
-            elif isinstance(value, dict):
-                values = list(value.items())
-            else:
-                values = [value]
-            if len(values) > 1:
-                values.insert(0, padding)
-                value = value_separator.join(values)
-            else:
-                value = ''.join(values)
-            items.append(template.format(
-                key=key,
-                operator=operator,
-                values=value,
-            ))
-        return items
-
-
-class FinalRootConfig(BaseRootConfig):
-
-    def _merge_with_key_value(self, key, another):
-        my_value = self.get(key, None)
-        if my_value is None:
-            return
-        if not isinstance(my_value, ConfigSection):
-            my_value = ConfigSection(another)
-
-        my_value.merge(another)
-        self[key] = my_value
-
-    def merge(self, another):
-        if isinstance(another, (tuple, list)):
-            another = ConfigSection(dict(another))
-        elif not isinstance(another, (dict, BaseRootConfig, ConfigSection)):
-            return
-
-        all_keys = set(self.keys()) | set(another.keys())
-        for key in self.keys():
-            if key in another:
-                section = self[key]
-                section.merge(another[key])
-            all_keys.remove(key)
-
-        for key in all_keys:
-            if not key in another:
-                continue
-            a_value = another.get(key)
-            self[key] = a_value
-
-    def _render_section(self, section, data, padding=4, wrapper_class=ConfigSection):
-        lines = []
-        if data is not None:
-            data = wrapper_class(data)
-            output = data.render(padding)
-            if isinstance(output, (tuple, list)):
-                lines.extend(output)
-            else:
-                lines.append(output)
-        lines.append('\n')
-        return lines
-
-    def render(self, padding=4):
-        lines = []
-
-        buildout = self.pop('buildout', None)
-        if buildout is not None:
-            buildout.operators.update({
-                'eggs': '+=',
-                'parts': '+=',
-            })
-        lines.extend(self._render_section('buildout', buildout, padding=padding))
-
-        versions = self.pop('versions', None)
-        lines.extend(self._render_section('versions', versions, padding=padding))
-
-        buildout_component = self.pop('buildout_component', None)
-
-        for section, data in self.items():
-            lines.extend(self._render_section(section, data, padding=padding))
-
-        lines.extend(self._render_section(
-            COMPONENT_SECTION_NAME_IN_CONFIG,
-            buildout_component,
-            padding=padding))
-
-        return '\n'.join(lines)
+"""
 
 
 class Command(object):
@@ -185,13 +50,15 @@ class Command(object):
             ))
             sys.exit(1)
 
-        common_parser = argparse.ArgumentParser(add_help=False)
-        common_parser.add_argument(
+        project_parser = argparse.ArgumentParser(add_help=False)
+        project_parser.add_argument(
             '-p',
             '--project-root',
             help='The project root directory. default=%(default)s',
             default=os.getcwd(),
         )
+
+        common_parser = argparse.ArgumentParser(add_help=False)
         common_parser.add_argument(
             '-c',
             '--components-dir',
@@ -204,17 +71,39 @@ class Command(object):
             help="The output file. default=%(default)s",
             default='buildout.cfg',
         )
+        common_parser.add_argument(
+            '--cache-dir',
+            help="The cache directory. default=%(default)s",
+            default='.buildout_component/',
+        )
 
         parser = argparse.ArgumentParser()
 
         subparsers = parser.add_subparsers()
 
-        # collect sub-command
-        setup_parser = subparsers.add_parser(
-            "setup",
-            help="Setup all options of components.",
-            parents=[common_parser]
-        )
+        # The arguments of a sub-command are added when it runs, see `parse_args`.
+        self.subcommand_parsers = OrderedDict()
+        for name, help_text, add_arguments, func in (
+                ('setup', "Setup all options of components.", self._add_setup_arguments, self.execute_setup),
+                ('setup-many', "Setup many projects in one run.", self._add_setup_many_arguments,
+                 self.execute_setup_many),
+                ('create', "Create component materials.", self._add_create_arguments, self.execute_create),
+                ('show-options', "Show options.", self._add_show_options_arguments, self.execute_show_options),
+                ('index', "Update the index of components.", None, self.execute_index),
+                ('pack', "Pack the components directory into a zip bundle.", self._add_pack_arguments,
+                 self.execute_pack),
+        ):
+            # The `setup-many` sub-command takes many project roots.
+            parents = [common_parser] if name == 'setup-many' else [project_parser, common_parser]
+            subparser = subparsers.add_parser(name, help=help_text, parents=parents)
+            subparser.set_defaults(func=func)
+            self.subcommand_parsers[name] = (subparser, add_arguments)
+
+        self.parser = parser
+
+    def _add_setup_arguments(self, setup_parser):
+        from buildout_component.profiling import HOOK_PROFILERS
+
         setup_parser.add_argument(
             '--include-disabled',
             help="Include component that disabled.",
@@ -231,19 +120,159 @@ class Command(object):
             help='Post-extends configure files.',
             nargs='*',
         )
+        setup_parser.add_argument(
+            '--cache-bytecode',
+            help="Keep the compiled hooks in the cache directory instead of removing `__pycache__`.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '--cache-results',
+            help="Reuse the cached results of components whose inputs did not change.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '--cache-hooks',
+            help="Record what every option hook reads, run only the hooks whose source or read values changed.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '-f',
+            '--force',
+            help="Setup even if the inputs did not change since the last run.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '--only',
+            help="Setup the given components (comma separated) and their dependencies only, "
+                 "the others keep their previous values.",
+            default=None,
+        )
+        setup_parser.add_argument(
+            '-w',
+            '--watch',
+            help="Keep running and setup again when the components changed.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '--watch-interval',
+            help="The polling interval in seconds, if `inotify` is not available. default=%(default)s",
+            type=float,
+            default=1.0,
+        )
+        setup_parser.add_argument(
+            '--profile',
+            help="Write the Chrome trace-event JSON of the run to the file and print the timing summary.",
+            metavar='TRACE_FILE',
+            default=None,
+        )
+        setup_parser.add_argument(
+            '--profile-hooks',
+            help="Capture a profile of every hook, the cProfile stats are written beside the trace file.",
+            choices=HOOK_PROFILERS,
+            default=None,
+        )
+        setup_parser.add_argument(
+            '-j',
+            '--jobs',
+            help="Run the hooks of independent components in parallel. default=%(default)s",
+            type=int,
+            default=1,
+        )
+        setup_parser.add_argument(
+            '--lazy',
+            help="Run a component when a hook reads its options or config, not only when it is a dependency. "
+                 "Not with `--hook-workers`.",
+            default=False,
+            action="store_true",
+        )
+        setup_parser.add_argument(
+            '--hook-concurrency',
+            help="Run the components on one event loop, the coroutine hooks of at most N ready components "
+                 "run concurrently.",
+            metavar='N',
+            type=int,
+            default=None,
+        )
+        setup_parser.add_argument(
+            '--hook-timeout',
+            help="The timeout in seconds of a coroutine hook, or of every hook with `--hook-workers`.",
+            metavar='SECONDS',
+            type=float,
+            default=None,
+        )
+        setup_parser.add_argument(
+            '--hook-workers',
+            help="Run the hooks in N worker processes, a hook that fails, hangs or exceeds the limits is stopped in "
+                 "its worker and reported as an error, the setup fails.",
+            metavar='N',
+            type=int,
+            default=None,
+        )
+        setup_parser.add_argument(
+            '--hook-memory-limit',
+            help="The address space limit in MB of a hook worker.",
+            metavar='MB',
+            type=float,
+            default=None,
+        )
+        setup_parser.add_argument(
+            '--hook-cpu-limit',
+            help="The CPU time limit in seconds of the hooks of a component in a hook worker.",
+            metavar='SECONDS',
+            type=float,
+            default=None,
+        )
         setup_parser.add_argument(
             'defaults',
             help="The defaults.",
             nargs="*",
         )
-        setup_parser.set_defaults(func=self.execute_setup)
 
-        # create-component subcommand
-        create_component_parser = subparsers.add_parser(
-            'create',
-            help="Create component materials.",
-            parents=[common_parser],
+    def _add_setup_many_arguments(self, setup_many_parser):
+        setup_many_parser.add_argument(
+            '-p',
+            '--project-root',
+            help="The project root directory, or a glob pattern of them. Repeat it for more projects.",
+            dest='project_roots',
+            metavar='PROJECT_ROOT',
+            action='append',
+            required=True,
+        )
+        setup_many_parser.add_argument(
+            '--include-disabled',
+            help="Include component that disabled.",
+            default=False,
+            action="store_true",
+        )
+        setup_many_parser.add_argument(
+            '--pre-extends',
+            help='Pre-extends configure files, relative to every project root.',
+            nargs='*',
+        )
+        setup_many_parser.add_argument(
+            '--post-extends',
+            help='Post-extends configure files, relative to every project root.',
+            nargs='*',
+        )
+        setup_many_parser.add_argument(
+            '-j',
+            '--jobs',
+            help="Setup the projects in parallel. default=%(default)s",
+            type=int,
+            default=1,
+        )
+        setup_many_parser.add_argument(
+            'defaults',
+            help="The defaults of all projects.",
+            nargs="*",
         )
+
+    def _add_create_arguments(self, create_component_parser):
         create_component_parser.add_argument(
             '--id',
             help="The id of component.",
@@ -271,255 +300,668 @@ class Command(object):
             help="The option names. format: <NAME>[=<VALUE>]",
             nargs="*",
         )
-        create_component_parser.set_defaults(func=self.execute_create)
 
-        # show-options subcommand
-        show_options_parser = subparsers.add_parser(
-            'show-options',
-            help="Show options.",
-            parents=[common_parser],
+    def _add_show_options_arguments(self, show_options_parser):
+        show_options_parser.add_argument(
+            'keys',
+            help="The option keys or component ids to show. format: <COMPONENT>[.<NAME>]",
+            nargs="*",
         )
-        show_options_parser.set_defaults(func=self.execute_show_options)
 
-        self.parser = parser
+    def _add_pack_arguments(self, pack_parser):
+        pack_parser.add_argument(
+            'bundle',
+            help="The zip bundle to write, put it in a components directory to use it.",
+        )
+        pack_parser.add_argument(
+            'components',
+            help="The component directory names to pack. default: all components",
+            nargs="*",
+        )
+
+    def _add_subcommand_arguments(self, args):
+        """
+        Add the arguments of the sub-command in `args` only, building all
+        parsers costs more than running `show-options`.
+        """
+        for arg in args:
+            if arg.startswith('-'):
+                continue
+            subparser, add_arguments = self.subcommand_parsers.get(arg, (None, None))
+            if add_arguments is not None:
+                add_arguments(subparser)
+                self.subcommand_parsers[arg] = (subparser, None)
+            return
+
+    def _get_component_index(self):
+        index = getattr(self, 'component_index', None)
+        if index is None:
+            from buildout_component.index import ComponentIndex, INDEX_FILE_NAME
+
+            index_path = os.path.join(self.options.cache_dir, INDEX_FILE_NAME)
+            index = self.component_index = ComponentIndex(self.options.components_dir, index_path).load()
+        return index
 
     def _scan_components(self):
+        from buildout_component.index import load_manifest
+
         all_component_list = []
         all_component_dict = OrderedDict()
 
-        for dir_name in os.listdir(self.options.components_dir):
-            if not dir_name.isidentifier():
-                continue
-            dir_path = os.path.join(self.options.components_dir, dir_name)
-            if not os.path.isdir(dir_path):
-                continue
-            manifest_path = os.path.join(dir_path, MANIFEST_NAME)
-            if not os.path.exists(manifest_path):
+        index = self._get_component_index()
+        with self.profiler.span('scan'):
+            entries = index.scan()
+
+        for dir_name, entry in entries:
+            disabled = entry['manifest'].get('disabled', False)
+            if disabled and not getattr(self.options, 'include_disabled', False):
+                sys.stderr.write(WARNING + "Component `{id}` is disabled.".format(
+                    id=entry['manifest']['id']
+                ) + TERMINATOR)
                 continue
 
-            with open(manifest_path, "r") as fp:
-                manifest = json.load(fp)
-                if not manifest:
-                    continue
-                if not isinstance(manifest, dict):
-                    continue
+            manifest = load_manifest(self.options.components_dir, dir_name, entry, self.options.cache_dir)
 
-                if not manifest.get('id', ''):
-                    manifest['id'] = dir_name.lower().replace("-", '_')
+            all_component_list.append(manifest)
+            all_component_dict[manifest.id] = manifest
 
-                disabled = manifest.get('disabled', False)
-                if disabled and not getattr(self.options, 'include_disabled', False):
-                    sys.stderr.write(WARNING + "Component `{id}` is disabled.".format(id=manifest['id']) + TERMINATOR)
-                    continue
+        if index.changed:
+            index.save()
 
-                manifest.update({
-                    'component_dir': os.path.join(self.options.components_dir, dir_name),
-                    'manifest_path': manifest_path,
-                })
+        self.all_component_list = all_component_list
+        self.all_component_dict = all_component_dict
 
-                manifest = Manifest(**manifest)
+    def _report(self, level, message):
+        from buildout_component.builders import LEVEL_ERROR
+
+        level = ERROR if level == LEVEL_ERROR else WARNING
+        sys.stderr.write(level + message + TERMINATOR + "\n")
+
+    def _get_builder(self):
+        builder = getattr(self, 'builder', None)
+        if builder is None:
+            from buildout_component.builders import Builder
+
+            builder = self.builder = Builder(
+                jobs=self.options.jobs,
+                prog=sys.argv[0],
+                profiler=self.profiler,
+                hook_concurrency=self.options.hook_concurrency,
+                hook_timeout=self.options.hook_timeout,
+                hook_workers=self.options.hook_workers,
+                hook_memory_limit=self.options.hook_memory_limit,
+                hook_cpu_limit=self.options.hook_cpu_limit,
+                lazy=self.options.lazy,
+            )
+        return builder
+
+    def _close_builder(self):
+        builder = getattr(self, 'builder', None)
+        if builder is not None:
+            builder.close()
+
+    def _collect_options(self, manifest, context):
+        return self._get_builder().collect_options(manifest, context, self.hook_loader, self._report)
+
+    def _resolve_dependencies(self):
+        graph = DependencyGraph(self.all_component_dict)
+        order = graph.topological_order()
+
+        for path in graph.missing_dependencies:
+            sys.stderr.write(WARNING + "Missing dependency: {path}".format(
+                path=' -> '.join(path)
+            ) + TERMINATOR + "\n")
+
+        self.dependency_graph = graph
+        return [self.all_component_dict[manifest_id] for manifest_id in order]
+
+    def _get_cached_result(self, manifest, defaults):
+        """
+        Return the `(cache_key, collected)` of the component, the `collected`
+        is None if it is not cached.
+        """
+        if self.result_cache is None or not manifest.cacheable:
+            return None, None
+        cache_key = self.result_cache.get_key(manifest, defaults, self.context.collected)
+        return cache_key, self.result_cache.get(manifest, cache_key)
+
+    def _set_cached_result(self, manifest, cache_key, collected):
+        if cache_key is None:
+            return
+        try:
+            self.result_cache.set(manifest, cache_key, collected)
+        except Exception as exc:
+            sys.stderr.write(WARNING + "Cache `{component}` result fail: {exc}".format(
+                component=manifest.id,
+                exc=exc,
+            ) + TERMINATOR + "\n")
 
-                manifest.hooks_dir_existed = os.path.exists(os.path.join(dir_path, HOOKS_DIR_NAME))
+    def _setup_manifest(self, manifest):
+        defaults = self.defaults.group_by.get(manifest.id, {})
 
-                all_component_list.append(manifest)
-                all_component_dict[manifest.id] = manifest
+        cache_key, collected = self._get_cached_result(manifest, defaults)
+        if collected is not None:
+            return collected
 
-        self.all_component_list = all_component_list
-        self.all_component_dict = all_component_dict
+        # Only the workers need the dependencies of the component.
+        dependencies = None
+        if self.options.hook_workers:
+            dependencies = self.dependency_graph.get_closure(manifest.dependencies)
+        collected = self._get_builder().setup_manifest(
+            manifest, self.context, self.hook_loader, defaults, self._report, dependencies, self.hook_cache)
+        self._set_cached_result(manifest, cache_key, collected)
+        return collected
 
-    def _default_collect_result_handler(self, manifest, name):
-        return manifest.defaults.get(name, None)
+    async def _setup_manifest_async(self, manifest):
+        defaults = self.defaults.group_by.get(manifest.id, {})
 
-    def _collect_options(self, manifest):
-        options = OrderedDict()
-        hooks_dir = os.path.join(self.options.components_dir, manifest.component_dir, HOOKS_DIR_NAME)
+        cache_key, collected = self._get_cached_result(manifest, defaults)
+        if collected is not None:
+            return collected
 
-        module_name_prefix = self._get_component_python_module_name()
+        collected = await self._get_builder().setup_manifest_async(
+            manifest, self.context, self.hook_loader, defaults, self._report)
+        self._set_cached_result(manifest, cache_key, collected)
+        return collected
 
-        for option_name in manifest.options:
-            try:
-                if manifest.hooks_dir_existed is False:
-                    raise ImportError()
-
-                module_name = '{module_name}.{component}.{hooks}.{option_name}'.format(
-                    module_name=module_name_prefix,
-                    hooks=HOOKS_DIR_NAME,
-                    component=manifest.id,
-                    option_name=option_name,
-                )
-                module = importlib.import_module(module_name)
-                handler = getattr(module, HOOK_FUNC_NAME, None)
-                if handler:
-                    result = handler(self.context)
-                else:
-                    raise ImportError()
+    def _get_hook_loader(self):
+        from buildout_component.loaders import HookLoader
 
-            except ImportError as exc:
-                message = "Import `{component}.{option_name} fail: {exc}".format(
-                    component=manifest.id,
-                    option_name=option_name,
-                    exc=exc
-                )
-                sys.stderr.write(ERROR + message + TERMINATOR + "\n")
-                result = self._default_collect_result_handler(manifest, option_name)
-            except Exception as exc:
-                message = "Execute `{component}.{option_name}` setup option fail: {exc}".format(
-                    exc=exc,
-                    component=manifest.id,
-                    option_name=option_name,
-                )
-                sys.stderr.write(ERROR + message + TERMINATOR + "\n")
-                raise exc
-            finally:
-                hook_file = os.path.join(hooks_dir, '{option_name}.pyc')
-                if os.path.exists(hook_file):
-                    os.remove(hook_file)
+        cache_dir = self.options.cache_dir if getattr(self.options, 'cache_bytecode', False) else None
+        return HookLoader(self.options.components_dir, cache_dir=cache_dir)
 
-            if not isinstance(result, dict):
-                result = {option_name: result}
+    def _get_result_cache(self):
+        if not getattr(self.options, 'cache_results', False):
+            return None
 
-            options.update(result)
+        from buildout_component.caches import ResultCache
 
-        py_cache_dir = os.path.join(hooks_dir, '__pycache__')
-        if os.path.exists(py_cache_dir):
-            shutil.rmtree(py_cache_dir, False)
+        return ResultCache(self.options.cache_dir, self.hook_loader)
 
-        return options
+    def _get_hook_cache(self):
+        if not getattr(self.options, 'cache_hooks', False):
+            return None
 
-    def _setup_manifest(self, manifest):
-        for dependency in manifest.dependencies:
-            dependency = self.all_component_dict.get(dependency, None)
-            if not dependency:
-                continue
-            self._setup_manifest(dependency)
+        from buildout_component.caches import HookCache
 
-        if manifest.id not in self.context.collected:
-            self.context.manifest = manifest
-            self.context.config = RootConfig(manifest)
-            self.context.defaults = self.defaults.group_by.get(manifest.id, {})
+        return HookCache(self.options.cache_dir, self.hook_loader)
 
-            options = self._collect_options(manifest)
+    def _get_option_store(self):
+        from buildout_component.stores import OptionStore, get_state_path
 
-            # Set the options as default to manifest's section.
-            for key, value in options.items():
-                self.context.config[manifest.section].setdefault(key, value)
+        return OptionStore(get_state_path(self.options.output_file))
 
-            self.context.collected[manifest.id] = OrderedDict({
-                'config': self.context.config,
-                'options': options
-            })
+    def _load_legacy_options(self):
+        """
+        Load the options pickled into the `buildout_component` section by the
+        old versions.
+        """
+        if not os.path.exists(self.options.output_file):
+            return None
+
+        import base64
+        import configparser
+        import pickle
 
-    def _get_component_python_module_name(self):
-        return os.path.basename(os.path.abspath(self.options.components_dir))
+        buildout_config = configparser.ConfigParser()
+        buildout_config.read(self.options.output_file)
+        if COMPONENT_SECTION_NAME_IN_CONFIG not in buildout_config.sections():
+            return None
+
+        data = buildout_config[COMPONENT_SECTION_NAME_IN_CONFIG].get('options', '')
+        if not data:
+            return None
+        return pickle.loads(base64.b64decode(data))
 
     def _get_defaults(self):
-        defaults = Options()
-
-        for manifest_id, manifest in self.all_component_dict.items():
-            for key, value in manifest.defaults.items():
-                defaults.put(manifest_id, key, value)
-
-        if os.path.exists(self.options.output_file):
-            buildout_config = configparser.ConfigParser()
-            buildout_config.read(self.options.output_file)
-            if COMPONENT_SECTION_NAME_IN_CONFIG in buildout_config.sections():
-                data = buildout_config[COMPONENT_SECTION_NAME_IN_CONFIG].get('options', '')
-                if data:
-                    try:
-                        data = pickle.loads(base64.b64decode(data))
-                        if data is not None:
-                            defaults.update(data)
-                    except Exception:
-                        pass
+        from buildout_component.builders import get_defaults
+
+        store = self._get_option_store()
+        previous = None
+        if store.exists():
+            previous = store.load()
+        else:
+            try:
+                previous = self._load_legacy_options()
+            except Exception:
+                pass
 
+        return get_defaults(self.all_component_list, previous, self._parse_defaults())
+
+    def _parse_defaults(self):
+        defaults = OrderedDict()
         if hasattr(self.options, 'defaults'):
             reg = re.compile('(?P<key>[^\s=]+)=(?P<value>.*)')
             for item in list(self.options.defaults):
                 match = reg.match(item)
                 if not match:
                     continue
-                key, value = match.group('key'), match.group('value')
-                defaults[key] = value
-
+                defaults[match.group('key')] = match.group('value')
         return defaults
 
-    def execute_setup(self):
-        self.context = Context()
+    def _collect_extends_files(self, extends):
+        import glob
+
+        results = []
+        if extends:
+            if not isinstance(extends, (tuple, list)):
+                extends = [extends]
+            for e in extends:
+                results.extend(glob.glob(e, recursive=False))
+        return results
+
+    def _get_fingerprint(self):
+        """
+        Return the digest of all inputs of `setup`, or None if a component is
+        not cacheable.
+        """
+        from buildout_component.caches import Fingerprint
+
+        fingerprint = Fingerprint()
+        fingerprint.update(
+            self.options.output_file,
+            getattr(self.options, 'include_disabled', False),
+            list(self.options.defaults or []),
+            self._collect_extends_files(self.options.pre_extends),
+            self._collect_extends_files(self.options.post_extends),
+        )
 
-        self._scan_components()
+        for manifest in self.all_component_list:
+            if not manifest.cacheable:
+                return None
+            fingerprint.update(sorted(manifest.to_dict().items()))
+            fingerprint.update_dir(self.hook_loader.get_hooks_dir(manifest))
+            fingerprint.update_file(self.hook_loader.get_component_hook_paths(manifest)[1])
 
-        if not self.all_component_list:
-            sys.exit(0)
+        fingerprint.update_file(self._get_option_store().path)
+        return fingerprint.hexdigest()
+
+    def _run_setup(self, affected=None):
+        """
+        Collect the options of components and write the output file, only the
+        `affected` components run again if it is given.
+        """
+        from buildout_component.bundles import close_bundles
 
-        self.defaults = self._get_defaults()
+        with self.profiler.span('defaults'):
+            self.defaults = self._get_defaults()
 
         self.results = OrderedDict()
+        self.result_cache = self._get_result_cache()
+        self.hook_cache = self._get_hook_cache()
 
         python_sys_path = os.path.dirname(os.path.abspath(self.options.components_dir))
         if python_sys_path not in sys.path:
             sys.path.insert(0, python_sys_path)
 
-        for manifest in self.all_component_list:
-            self._setup_manifest(manifest)
+        with self.profiler.span('resolve'):
+            self._resolve_dependencies()
 
-        final_root_config = FinalRootConfig()
-        final_options = Options()
+        collected = self.context.collected
+        for manifest_id in list(collected.keys()):
+            if affected is None or manifest_id in affected or manifest_id not in self.dependency_graph:
+                del collected[manifest_id]
 
-        for manifest_id, collected_data in self.context.collected.items():
-            collected_config = collected_data.get('config')
-            final_root_config.merge(collected_config)
+        executor = self._get_builder().get_executor(self._setup_manifest, self._setup_manifest_async, self.context)
+        with self.profiler.span('hooks'):
+            try:
+                executor.execute(self.dependency_graph, collected)
+            finally:
+                # The watch mode runs again, the bundles are not kept open between the runs.
+                close_bundles()
+
+        if self.hook_cache is not None and (self.hook_cache.ran or self.hook_cache.reused):
+            print(INFO + "Run {ran} option hooks, reuse {reused}. ".format(
+                ran=self.hook_cache.ran,
+                reused=self.hook_cache.reused,
+            ) + TERMINATOR)
 
-            collected_options = collected_data.get('options', {})
+        self._write_output()
 
-            for key, value in collected_options.items():
-                final_options.put(manifest_id, key, value)
+    def _write_output(self):
+        from datetime import datetime
 
-        def _collect_extends_files(extends):
-            results = []
-            if extends:
-                if not isinstance(extends, (tuple, list)):
-                    extends = [extends]
-                for e in extends:
-                    results.extend(glob.glob(e, recursive=False))
-            return results
+        from buildout_component.builders import apply_extends, create_component_section, merge_collected, \
+            write_output
+
+        with self.profiler.span('merge'):
+            final_root_config, final_options = merge_collected(self.context.collected)
 
         # Handle the extends
-        buildout_config = final_root_config['buildout']
-        pre_extends = _collect_extends_files(self.options.pre_extends)
-        post_extends = _collect_extends_files(self.options.post_extends)
-        if pre_extends or post_extends:
-            extends = []
-            if pre_extends:
-                extends.extend(pre_extends)
-            extends.extend(buildout_config['extends'])
-            if post_extends:
-                extends.extend(post_extends)
-            buildout_config._data['extends'] = extends
+        apply_extends(
+            final_root_config,
+            self._collect_extends_files(self.options.pre_extends),
+            self._collect_extends_files(self.options.post_extends),
+        )
 
         # Handle the buildout-component section.
         create_time = datetime.utcnow()
-        buildout_component = _ConfigSection()
 
-        serialized_options = base64.b64encode(pickle.dumps(final_options)).decode('utf-8')
-        buildout_component['options'] = textwrap.fill(serialized_options, 60).split('\n')
-        buildout_component['create_time'] = repr(str(create_time))
+        store = self._get_option_store()
+        with self.profiler.span('store'):
+            store.save(final_options, OrderedDict(
+                (manifest_id, collected_data.get('config'))
+                for manifest_id, collected_data in self.context.collected.items()
+            ))
+        final_root_config[COMPONENT_SECTION_NAME_IN_CONFIG] = create_component_section(store.path, create_time)
+
+        output_file = self.options.output_file
+        action = "Update" if os.path.exists(output_file) else "Create"
 
-        final_root_config[COMPONENT_SECTION_NAME_IN_CONFIG] = buildout_component
-        rendered_data = final_root_config.render()
+        # Stream the sections to the file, the whole content is never built in memory.
+        with self.profiler.span('render'):
+            changed = write_output(output_file, final_root_config, sys.argv[0], create_time)
 
-        action = "Update" if os.path.exists(self.options.output_file) else "Create"
-        with open(self.options.output_file, 'w') as fp:
-            fp.write("# The buildout component configure file.\n")
-            fp.write("# *** DO NOT EDIT THIS FILE, IT WILL GENERATE BY `{prog}`\n".format(prog=sys.argv[0]))
-            fp.write("# Create Time: {create_time}\n".format(create_time=create_time))
-            fp.write(rendered_data)
+        if not changed:
+            print(SUCCESS + "{output_file} is up to date. ".format(
+                output_file=output_file
+            ) + TERMINATOR)
+            return
 
         print(SUCCESS + "{action} {output_file} success. ".format(
             action=action,
-            output_file=self.options.output_file
+            output_file=output_file
+        ) + TERMINATOR)
+
+    def _get_only_components(self):
+        only = getattr(self.options, 'only', None)
+        if not only:
+            return None
+        return [i.strip() for i in only.split(',') if i.strip()]
+
+    def _load_previous_collected(self, selected):
+        """
+        Load the previous options and config of the components outside the
+        `selected` components and their dependencies.
+        """
+        self._resolve_dependencies()
+        closure = self.dependency_graph.get_closure(selected)
+
+        store = self._get_option_store()
+        configs = store.load_configs(self.all_component_dict)
+        for manifest_id in self.dependency_graph.topological_order():
+            if manifest_id in closure:
+                continue
+            if manifest_id not in configs:
+                sys.stderr.write(WARNING + "No previous state of `{id}`, setup it again.".format(
+                    id=manifest_id
+                ) + TERMINATOR + "\n")
+                continue
+            self.context.collected[manifest_id] = OrderedDict({
+                'config': configs[manifest_id],
+                'options': store.get_component(manifest_id),
+            })
+        return closure
+
+    def _get_profiler(self):
+        profile = getattr(self.options, 'profile', None)
+        return Profiler(enabled=bool(profile), hook_profiler=getattr(self.options, 'profile_hooks', None))
+
+    def _report_profile(self):
+        if not self.profiler.enabled:
+            return
+
+        trace_file = self.options.profile
+        self.profiler.write_trace(trace_file)
+        self.profiler.write_hook_profiles('{trace_file}.hooks'.format(trace_file=trace_file))
+        sys.stderr.write(self.profiler.summary() + "\n")
+        sys.stderr.write(INFO + "Write the trace to {trace_file}. ".format(trace_file=trace_file) + TERMINATOR + "\n")
+        self.profiler.reset()
+
+    def _get_outputs(self):
+        return [self.options.output_file, self._get_option_store().path]
+
+    def _update_fingerprint(self):
+        # The state file is an input of the next run.
+        from buildout_component.caches import FingerprintStore
+
+        fingerprint = self._get_fingerprint()
+        if fingerprint:
+            FingerprintStore(self.options.cache_dir).set(self.options.output_file, fingerprint, self._get_outputs())
+
+    def _get_changes(self, paths):
+        """
+        Map the changed paths to the `{dir_name: set(option_name or None)}`
+        of the changed components, `None` means a non-hook file or the
+        component hook module changed.
+        """
+        from buildout_component.loaders import HOOKS_DIR_NAME
+
+        components_dir = os.path.abspath(self.options.components_dir)
+        changes = OrderedDict()
+        for path in sorted(paths):
+            names = os.path.relpath(path, components_dir).split(os.sep)
+            if names[0] in (os.curdir, os.pardir):
+                continue
+            option_name = None
+            if len(names) == 3 and names[1] == HOOKS_DIR_NAME and names[2].endswith('.py') and \
+                    names[2] != '__init__.py':
+                option_name = names[2][:-len('.py')]
+            changes.setdefault(names[0], set()).add(option_name)
+        return changes
+
+    def _get_dir_name(self, manifest):
+        # The name in the components directory, the bundle of a bundled component.
+        if manifest.bundle_path:
+            return os.path.basename(manifest.bundle_path)
+        return os.path.basename(os.path.normpath(manifest.component_dir))
+
+    def _report_watch_error(self, exc):
+        # Not reported by the builder, like an error writing the output.
+        sys.stderr.write(ERROR + "Setup fail: {name}: {exc}".format(
+            name=exc.__class__.__name__,
+            exc=exc,
+        ) + TERMINATOR + "\n")
+
+    def _watch(self):
+        from buildout_component.watchers import get_watcher
+
+        watcher = get_watcher(self.options.components_dir, interval=self.options.watch_interval)
+        print(INFO + "Watching {components_dir} for changes, press Ctrl+C to stop. ".format(
+            components_dir=self.options.components_dir
+        ) + TERMINATOR)
+
+        try:
+            while True:
+                changes = self._get_changes(watcher.wait())
+                if not changes:
+                    continue
+
+                # Unload the changed hooks of the components before scanning.
+                changed_ids = set()
+                for manifest in self.all_component_list:
+                    dir_name = self._get_dir_name(manifest)
+                    if dir_name not in changes:
+                        continue
+                    changed_ids.add(manifest.id)
+                    for option_name in changes[dir_name]:
+                        if option_name in manifest.options:
+                            self.hook_loader.unload(manifest, option_name)
+                        else:
+                            self.hook_loader.unload(manifest)
+
+                try:
+                    self._scan_components()
+                    for manifest in self.all_component_list:
+                        dir_name = self._get_dir_name(manifest)
+                        if dir_name in changes:
+                            changed_ids.add(manifest.id)
+
+                    self._resolve_dependencies()
+                    affected = self.dependency_graph.get_dependents(
+                        i for i in changed_ids if i in self.dependency_graph
+                    )
+                    print(INFO + "Setup {components}. ".format(components=', '.join(affected) or '-') + TERMINATOR)
+                    self._run_setup(affected=set(affected))
+                    self._update_fingerprint()
+                    self._report_profile()
+                except DependencyError as exc:
+                    sys.stderr.write(ERROR + str(exc) + TERMINATOR + "\n")
+                except HookError:
+                    # The hook error is reported already, keep watching.
+                    pass
+                except Exception as exc:
+                    self._report_watch_error(exc)
+        except KeyboardInterrupt:
+            sys.stderr.write("\n" + WARNING + "User break. " + TERMINATOR + "\n")
+        finally:
+            watcher.close()
+
+    def execute_setup(self):
+        from buildout_component.caches import FingerprintStore
+
+        if self.options.lazy and self.options.hook_workers:
+            sys.stderr.write(ERROR + "The `--lazy` can not be used with `--hook-workers`, the hooks in workers read "
+                                     "their dependencies only." + TERMINATOR + "\n")
+            sys.exit(1)
+
+        self.context = Context()
+
+        self._scan_components()
+
+        if not self.all_component_list and not self.options.watch:
+            sys.exit(0)
+
+        self.hook_loader = self._get_hook_loader()
+
+        only = self._get_only_components()
+        for manifest_id in only or []:
+            if manifest_id not in self.all_component_dict:
+                sys.stderr.write(ERROR + "Component `{id}` is not found.".format(id=manifest_id) + TERMINATOR + "\n")
+                sys.exit(1)
+
+        with self.profiler.span('fingerprint'):
+            fingerprint = self._get_fingerprint()
+            up_to_date = fingerprint and not only and not self.options.force and not self.options.watch and \
+                FingerprintStore(self.options.cache_dir).is_up_to_date(
+                    self.options.output_file, fingerprint, self._get_outputs())
+        if up_to_date:
+            print(SUCCESS + "{output_file} is up to date. ".format(
+                output_file=self.options.output_file
+            ) + TERMINATOR)
+            self._report_profile()
+            return
+
+        try:
+            try:
+                if only:
+                    self._run_setup(affected=set(self._load_previous_collected(only)))
+                else:
+                    self._run_setup()
+                    self._update_fingerprint()
+            except DependencyError as exc:
+                sys.stderr.write(ERROR + str(exc) + TERMINATOR + "\n")
+                if not self.options.watch:
+                    sys.exit(1)
+            except HookError:
+                # The hook error is reported already, keep watching.
+                if not self.options.watch:
+                    raise
+            except Exception as exc:
+                if not self.options.watch:
+                    raise
+                self._report_watch_error(exc)
+
+            self._report_profile()
+
+            if self.options.watch:
+                self._watch()
+        finally:
+            self._close_builder()
+
+    def _get_project_roots(self):
+        import glob
+
+        project_roots = []
+        for pattern in self.options.project_roots:
+            paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            for path in paths:
+                path = os.path.abspath(path)
+                if os.path.isdir(path) and path not in project_roots:
+                    project_roots.append(path)
+        return project_roots
+
+    def _setup_project(self, builder, project):
+        """
+        Build and write the project, return the `(status, components, seconds)`.
+        """
+        start = time.perf_counter()
+        result = builder.build(project)
+        for level, message in result.messages:
+            self._report(level, "{project}: {message}".format(project=project.project_root, message=message))
+
+        if not result.manifests:
+            status = 'no components'
+        else:
+            existed = os.path.exists(project.output_file)
+            if not result.write():
+                status = 'up to date'
+            else:
+                status = 'updated' if existed else 'created'
+        return status, len(result.manifests), time.perf_counter() - start
+
+    def execute_setup_many(self):
+        from concurrent import futures
+
+        from buildout_component.builders import Builder, Project
+
+        project_roots = self._get_project_roots()
+        if not project_roots:
+            sys.stderr.write(ERROR + "No project root is found." + TERMINATOR + "\n")
+            sys.exit(1)
+
+        # One builder for all projects, the manifests and the hooks of the
+        # components directories with the same real path are shared.
+        builder = Builder(prog=sys.argv[0])
+        defaults = self._parse_defaults()
+
+        submitted = OrderedDict()
+        start = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=max(1, self.options.jobs)) as pool:
+            for project_root in project_roots:
+                project = Project(
+                    project_root,
+                    components_dir=self.options.components_dir,
+                    output_file=self.options.output_file,
+                    cache_dir=self.options.cache_dir,
+                    defaults=defaults,
+                    include_disabled=self.options.include_disabled,
+                    pre_extends=self.options.pre_extends,
+                    post_extends=self.options.post_extends,
+                )
+                submitted[project_root] = pool.submit(self._setup_project, builder, project)
+
+        failed = 0
+        line = '{project:<50} {status:<16} {components:>10} {time:>12}'
+        print(line.format(project='PROJECT', status='STATUS', components='COMPONENTS', time='TIME (ms)'))
+        for project_root, future in submitted.items():
+            try:
+                status, components, seconds = future.result()
+            except Exception as exc:
+                failed += 1
+                sys.stderr.write(ERROR + "{project}: {exc}".format(project=project_root, exc=exc) + TERMINATOR + "\n")
+                status, components, seconds = 'failed', '-', None
+            print(line.format(
+                project=os.path.relpath(project_root),
+                status=status,
+                components=components,
+                time='-' if seconds is None else '{:.3f}'.format(seconds * 1000),
+            ))
+
+        print((SUCCESS if not failed else ERROR) + "Setup {count} projects, {failed} failed in {time:.3f} ms. ".format(
+            count=len(submitted),
+            failed=failed,
+            time=(time.perf_counter() - start) * 1000,
         ) + TERMINATOR)
+        if failed:
+            sys.exit(1)
 
     def execute_create(self):
+        import json
+
+        from buildout_component.index import MANIFEST_NAME
+        from buildout_component.loaders import HOOKS_DIR_NAME, HOOK_FUNC_NAME
+
         try:
             _id = self.options.id
             while not _id:
@@ -586,36 +1028,97 @@ class Command(object):
                 hook_file_path = os.path.join(hooks_dir, '{option}.py'.format(option=option))
                 if not os.path.exists(hook_file_path):
                     with open(hook_file_path, "w") as fp:
-                        fp.write(HOOK_FILE_TEMPLATE)
+                        fp.write(HOOK_FILE_TEMPLATE.format(hook_func_name=HOOK_FUNC_NAME))
 
             print(SUCCESS + "Component create success." + TERMINATOR)
         except KeyboardInterrupt:
             sys.stderr.write("\n" + WARNING + "User break. " + TERMINATOR + "\n")
             sys.exit(1)
 
-    def execute_show_options(self):
-        if not os.path.exists(self.options.output_file):
-            return
+    def execute_index(self):
+        index = self._get_component_index()
+        components = index.scan()
+        index.save()
+
+        print(SUCCESS + "Index {count} components to {index_path} success. ".format(
+            count=len(components),
+            index_path=index.index_path,
+        ) + TERMINATOR)
+
+    def execute_pack(self):
+        from buildout_component.bundles import BUNDLE_SUFFIX, pack_components
+        from buildout_component.index import MANIFEST_NAME
+
+        if not self.options.bundle.endswith(BUNDLE_SUFFIX):
+            sys.stderr.write(ERROR + "The bundle file name must end with `{suffix}`.".format(
+                suffix=BUNDLE_SUFFIX
+            ) + TERMINATOR + "\n")
+            sys.exit(1)
+
+        for dir_name in self.options.components:
+            if not os.path.isfile(os.path.join(self.options.components_dir, dir_name, MANIFEST_NAME)):
+                sys.stderr.write(ERROR + "Component `{id}` is not found.".format(id=dir_name) + TERMINATOR + "\n")
+                sys.exit(1)
+
+        dir_names = pack_components(self.options.components_dir, self.options.bundle, self.options.components or None)
 
-        config = configparser.ConfigParser()
-        config.read(self.options.output_file)
-        if COMPONENT_SECTION_NAME_IN_CONFIG in config:
-            options = config[COMPONENT_SECTION_NAME_IN_CONFIG].get('options', '')
+        print(SUCCESS + "Pack {count} components to {bundle} success. ".format(
+            count=len(dir_names),
+            bundle=self.options.bundle,
+        ) + TERMINATOR)
+
+    def execute_show_options(self):
+        store = self._get_option_store()
+        if not store.exists():
+            options = self._load_legacy_options()
             if not options:
                 return
-            options = pickle.loads(base64.b64decode(options))
-            for key, value in options.items():
+        elif not self.options.keys:
+            options = store.load()
+        else:
+            # Read the requested options only.
+            options = None
+
+        keys = self.options.keys or list(options.keys())
+        for key in keys:
+            component, _, name = key.partition('.')
+            if name:
+                if options is not None:
+                    value = options.get(key, None)
+                else:
+                    value = store.get(component, name)
                 print("{key}={value}".format(key=key, value=repr(value)))
+                continue
+
+            if options is not None:
+                items = options.group_by.get(component, {})
+            else:
+                items = store.get_component(component)
+            for name, value in items.items():
+                print("{component}.{name}={value}".format(component=component, name=name, value=repr(value)))
 
-    def execute(self):
-        self.options = self.parser.parse_args()
+    def parse_args(self, args=None):
+        if args is None:
+            args = sys.argv[1:]
+        self._add_subcommand_arguments(args)
+        self.options = self.parser.parse_args(args)
 
         if hasattr(self.options, 'func'):
-            setup_path = lambda p: p if os.path.isabs(p) else os.path.join(self.options.project_root, p)
+            # The paths of `setup-many` are relative to every project root.
+            if hasattr(self.options, 'project_root'):
+                setup_path = lambda p: p if os.path.isabs(p) else os.path.join(self.options.project_root, p)
 
-            self.options.components_dir = setup_path(self.options.components_dir)
-            self.options.output_file = setup_path(self.options.output_file)
+                self.options.components_dir = setup_path(self.options.components_dir)
+                self.options.output_file = setup_path(self.options.output_file)
+                self.options.cache_dir = setup_path(self.options.cache_dir)
 
+            self.profiler = self._get_profiler()
+        return self.options
+
+    def execute(self, args=None):
+        self.parse_args(args)
+
+        if hasattr(self.options, 'func'):
             self.options.func()
         else:
             self.parser.print_help()
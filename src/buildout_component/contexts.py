@@ -25,6 +25,9 @@ class Context(object):
                     config
                     options
 
+    The `resolver` returns the collected data of a component that is not
+    collected yet, by running it on demand, or None. The `tracker` records
+    the reads of the running hook, see `tracking`.
     """
 
     def __init__(self):
@@ -33,6 +36,8 @@ class Context(object):
         self.options = OrderedDict()
         self.defaults = OrderedDict()
         self.collected = OrderedDict()
+        self.resolver = None
+        self.tracker = None
 
     def __delattr__(self, key):
         if key in _readonly_context_names:
@@ -48,11 +53,33 @@ class Context(object):
             collected=repr(self.collected),
         )
 
-    def get_collected_option(self, manifest, name, default=None):
+    def fork(self, manifest=None, config=None, defaults=None):
+        """
+        Create a context view for one component, the `collected` is shared.
+        """
+        context = self.__class__()
+        context.manifest = manifest
+        context.config = config if config is not None else OrderedDict()
+        context.defaults = defaults if defaults is not None else OrderedDict()
+        context.collected = self.collected
+        context.resolver = self.resolver
+        return context
+
+    def _get_collected(self, manifest):
         manifest = _force_manifest_id(manifest)
-        options = self.collected.get(manifest, {}).get('options', {})
+        collected = self.collected.get(manifest, None)
+        if collected is None and self.resolver is not None:
+            collected = self.resolver(manifest)
+        return collected or {}
+
+    def get_collected_option(self, manifest, name, default=None):
+        options = self._get_collected(manifest).get('options', {})
+        if self.tracker is not None:
+            self.tracker.read_option(_force_manifest_id(manifest), name, options)
         return options.get(name, default)
 
     def get_collected_config(self, manifest):
-        manifest = _force_manifest_id(manifest)
-        return self.collected.get(manifest, {}).get('config', {})
+        config = self._get_collected(manifest).get('config', {})
+        if self.tracker is not None:
+            self.tracker.read(('config', _force_manifest_id(manifest)), config)
+        return config
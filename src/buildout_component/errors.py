@@ -16,3 +16,45 @@ class ImmutableValueError(ValueError):
 
 class ImmutableAttributeError(AttributeError):
     pass
+
+
+class DependencyError(ValueError):
+    message = "Dependency error"
+
+    def __init__(self, path):
+        self.path = list(path)
+        super().__init__("{message}: {path}".format(
+            message=self.message,
+            path=' -> '.join(self.path),
+        ))
+
+
+class CyclicDependencyError(DependencyError):
+    message = "Cyclic dependency"
+
+
+class HookError(RuntimeError):
+    """
+    A hook failed and it is reported already. The exception of a hook in the
+    process is the `__cause__`, the `details` is the traceback of a hook in a
+    worker process. The `option_name` is None when the component failed out
+    of its hooks.
+    """
+
+    def __init__(self, component, option_name, message, details=None):
+        self.component = component
+        self.option_name = option_name
+        self.details = details
+        if option_name is None:
+            text = "Setup component `{component}` fail: {message}".format(component=component, message=message)
+        else:
+            text = "Execute `{component}.{option_name}` setup option fail: {message}".format(
+                component=component,
+                option_name=option_name,
+                message=message,
+            )
+        super().__init__(text)
+
+
+class HookTimeoutError(HookError):
+    pass
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import asyncio
+from collections import OrderedDict
+from concurrent import futures
+
+from buildout_component.errors import CyclicDependencyError
+
+
+def run_coroutine(coroutine):
+    """
+    Run the coroutine to its end and return its result. Under a running
+    event loop, which can not be nested, it runs on a loop of its own thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+class BaseExecutor(object):
+    """
+    Run the `setup` callable of every component of the dependency graph and
+    store the results into `collected`, in the topological order.
+    """
+
+    def __init__(self, setup):
+        self.setup = setup
+
+    def execute(self, graph, collected):
+        raise NotImplementedError()
+
+    def _sort_collected(self, graph, collected):
+        ordered = OrderedDict((i, collected[i]) for i in graph.topological_order() if i in collected)
+        ordered.update(collected)
+        collected.clear()
+        collected.update(ordered)
+        return collected
+
+
+class SerialExecutor(BaseExecutor):
+
+    def execute(self, graph, collected):
+        for manifest_id in graph.topological_order():
+            if manifest_id not in collected:
+                collected[manifest_id] = self.setup(graph.manifests[manifest_id])
+        return self._sort_collected(graph, collected)
+
+
+class ThreadPoolExecutor(BaseExecutor):
+    """
+    Run the components level by level on a thread pool, the components of one
+    level do not depend on each other.
+    """
+
+    def __init__(self, setup, jobs):
+        super().__init__(setup)
+        self.jobs = jobs
+
+    def execute(self, graph, collected):
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for level in graph.levels():
+                submitted = OrderedDict()
+                for manifest_id in level:
+                    if manifest_id in collected:
+                        continue
+                    submitted[manifest_id] = pool.submit(self.setup, graph.manifests[manifest_id])
+
+                # Make the results visible to the next level.
+                for manifest_id, future in submitted.items():
+                    collected[manifest_id] = future.result()
+
+        # Merge in the same order as the serial executor.
+        return self._sort_collected(graph, collected)
+
+
+class LazyExecutor(BaseExecutor):
+    """
+    Run the components on demand, one by one: a component runs when a
+    component depending on it runs, or when a hook reads its options or
+    config by the `resolve` callable (the `Context.resolver`).
+
+    Only the `manifest_ids` components (all if it is None) are run to begin
+    with, the others run only if they are read. The results are memoized in
+    `collected`, a read in a cycle raises `CyclicDependencyError`.
+    """
+
+    def __init__(self, setup, manifest_ids=None):
+        super().__init__(setup)
+        self.manifest_ids = manifest_ids
+        self.graph = None
+        self.collected = None
+        self.path = []
+
+    def resolve(self, manifest_id):
+        graph, collected = self.graph, self.collected
+        if collected is None or manifest_id not in graph.manifests:
+            return None
+        if manifest_id in collected:
+            return collected[manifest_id]
+
+        path = self.path
+        if path and path[-1] == manifest_id:
+            # A component reads itself, it is not collected yet.
+            return None
+        if manifest_id in path:
+            raise CyclicDependencyError(path[path.index(manifest_id):] + [manifest_id])
+
+        path.append(manifest_id)
+        try:
+            for dependency in graph.get_dependencies(manifest_id):
+                self.resolve(dependency)
+            if manifest_id not in collected:
+                collected[manifest_id] = self.setup(graph.manifests[manifest_id])
+            return collected[manifest_id]
+        finally:
+            path.pop()
+
+    def execute(self, graph, collected):
+        order = graph.topological_order()
+        if self.manifest_ids is not None:
+            manifest_ids = set(self.manifest_ids)
+            order = [i for i in order if i in manifest_ids]
+
+        self.graph, self.collected, self.path = graph, collected, []
+        try:
+            for manifest_id in order:
+                self.resolve(manifest_id)
+        finally:
+            self.graph, self.collected = None, None
+        return self._sort_collected(graph, collected)
+
+
+class AsyncioExecutor(BaseExecutor):
+    """
+    Run the components as the tasks of one event loop, the `setup` is a
+    coroutine function. A component starts when its dependencies are
+    collected, at most `concurrency` components run at a time. Called from
+    a running event loop, the components run on a loop of another thread.
+    """
+
+    def __init__(self, setup, concurrency):
+        super().__init__(setup)
+        self.concurrency = concurrency
+
+    async def _execute(self, graph, collected):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = OrderedDict()
+
+        async def run(manifest_id):
+            dependencies = [tasks[i] for i in graph.get_dependencies(manifest_id) if i in tasks]
+            if dependencies:
+                await asyncio.gather(*dependencies)
+            async with semaphore:
+                collected[manifest_id] = await self.setup(graph.manifests[manifest_id])
+
+        # The dependencies come first in the topological order.
+        for manifest_id in graph.topological_order():
+            if manifest_id not in collected:
+                tasks[manifest_id] = asyncio.ensure_future(run(manifest_id))
+        await asyncio.gather(*tasks.values())
+
+    def execute(self, graph, collected):
+        run_coroutine(self._execute(graph, collected))
+        return self._sort_collected(graph, collected)
+
+
+def get_executor(setup, jobs=1):
+    if jobs and jobs > 1:
+        return ThreadPoolExecutor(setup, jobs)
+    return SerialExecutor(setup)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+from buildout_component.errors import CyclicDependencyError
+
+_VISITING = 1
+_VISITED = 2
+
+
+class DependencyGraph(object):
+    """
+    The dependency graph (DAG) of components.
+
+    The graph is built once from the `{id: Manifest}` mapping, the topological
+    order is computed lazily with an iterative depth-first walk and memoized,
+    so every component and every dependency edge is visited exactly once. The
+    missing dependencies are collected in `missing_dependencies`.
+    """
+
+    def __init__(self, manifests):
+        self.manifests = manifests
+        self.missing_dependencies = []
+
+        self._order = None
+        self._positions = None
+        self._levels = None
+
+    def __contains__(self, item):
+        return item in self.manifests
+
+    def __len__(self):
+        return len(self.manifests)
+
+    def get_dependencies(self, manifest_id):
+        manifest = self.manifests.get(manifest_id, None)
+        if manifest is None:
+            return []
+        return manifest.dependencies or []
+
+    def _visit(self, root, states, order):
+        states[root] = _VISITING
+        stack = [(root, iter(self.get_dependencies(root)))]
+
+        while stack:
+            node, dependencies = stack[-1]
+            for dependency in dependencies:
+                if dependency not in self.manifests:
+                    self.missing_dependencies.append([n for n, _ in stack] + [dependency])
+                    continue
+
+                state = states.get(dependency, None)
+                if state == _VISITED:
+                    continue
+                if state == _VISITING:
+                    path = [n for n, _ in stack]
+                    path = path[path.index(dependency):] + [dependency]
+                    raise CyclicDependencyError(path)
+
+                states[dependency] = _VISITING
+                stack.append((dependency, iter(self.get_dependencies(dependency))))
+                break
+            else:
+                stack.pop()
+                states[node] = _VISITED
+                order.append(node)
+
+    def _get_order(self):
+        if self._order is None:
+            states = {}
+            order = []
+            self.missing_dependencies = []
+            for manifest_id in self.manifests:
+                if manifest_id not in states:
+                    self._visit(manifest_id, states, order)
+            self._order = order
+            self._positions = dict((manifest_id, i) for i, manifest_id in enumerate(order))
+        return self._order
+
+    def topological_order(self):
+        """
+        Return the component ids, every dependency before its dependents.
+
+        The order is the same as the depth-first, dependencies-first walk in
+        the order of the manifests mapping.
+        """
+        return list(self._get_order())
+
+    def levels(self):
+        """
+        Return the component ids grouped by depth, the components of one level
+        do not depend on each other.
+        """
+        if self._levels is None:
+            depth = {}
+            levels = []
+            for manifest_id in self._get_order():
+                level = 0
+                for dependency in self.get_dependencies(manifest_id):
+                    if dependency in depth:
+                        level = max(level, depth[dependency] + 1)
+                depth[manifest_id] = level
+                if level == len(levels):
+                    levels.append([])
+                levels[level].append(manifest_id)
+            self._levels = levels
+        return [list(level) for level in self._levels]
+
+    def get_dependents(self, manifest_ids):
+        """
+        Return the given components and all components that depend on them,
+        directly or not, in the topological order.
+        """
+        order = self._get_order()
+        affected = set(manifest_ids)
+        for manifest_id in order:
+            if manifest_id in affected:
+                continue
+            if any(d in affected for d in self.get_dependencies(manifest_id)):
+                affected.add(manifest_id)
+        return [i for i in order if i in affected]
+
+    def get_closure(self, manifest_ids):
+        """
+        Return the given components and all their dependencies, directly or
+        not, in the topological order. Only the closure is sorted, not the
+        whole graph walked.
+        """
+        self._get_order()
+        closure = set()
+        pending = [i for i in manifest_ids if i in self.manifests]
+        while pending:
+            manifest_id = pending.pop()
+            if manifest_id in closure:
+                continue
+            closure.add(manifest_id)
+            pending.extend(d for d in self.get_dependencies(manifest_id) if d in self.manifests)
+        return sorted(closure, key=self._positions.__getitem__)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import copy
+import json
+import os
+from collections import OrderedDict
+
+from buildout_component.bundles import RESOURCES_DIR_NAME, get_bundle, is_bundle_name
+from buildout_component.loaders import HOOKS_DIR_NAME
+from buildout_component.models import Manifest
+from buildout_component.utils import atomic_write
+
+MANIFEST_NAME = "manifest.json"
+INDEX_FILE_NAME = 'index.json'
+INDEX_VERSION = 1
+
+
+def load_manifest(components_dir, dir_name, entry, cache_dir=None):
+    """
+    Create the `Manifest` of an index entry, the entry is not changed. The
+    `dir_name` of a bundled component is the path through its bundle, the
+    files it joins are extracted into the `cache_dir`.
+    """
+    data = copy.deepcopy(entry['manifest'])
+    data.update({
+        'component_dir': os.path.join(components_dir, dir_name),
+        'manifest_path': os.path.join(components_dir, dir_name, MANIFEST_NAME),
+    })
+    if entry.get('bundle'):
+        data['bundle_path'] = os.path.join(components_dir, entry['bundle'])
+        if cache_dir:
+            data['resources_dir'] = os.path.join(cache_dir, RESOURCES_DIR_NAME)
+
+    manifest = Manifest(**data)
+    manifest.hooks_dir_existed = entry['hooks_dir_existed']
+    return manifest
+
+
+def _get_stamp(stat):
+    if stat is None:
+        return None
+    return [stat.st_mtime_ns, stat.st_ino, stat.st_size]
+
+
+class ComponentIndex(object):
+    """
+    The single-file index of the parsed manifests of a components directory.
+
+    Every entry is stamped with the mtime and inode of the component
+    directory and of its `manifest.json`, a scan re-parses only the manifests
+    whose stamp changed.
+
+    The `.zip` bundles in the directory are scanned too, see `bundles`. The
+    entries of a bundle are stamped with the bundle file and the CRC of the
+    manifests, they are reused without opening the bundle while it does not
+    change. A component directory overrides the bundled component of the same
+    name, the bundles are scanned by their names.
+    """
+
+    def __init__(self, components_dir, index_path):
+        self.components_dir = os.path.abspath(components_dir)
+        self.index_path = index_path
+        self.entries = OrderedDict()
+        self.changed = False
+
+    def load(self):
+        self.entries = OrderedDict()
+        try:
+            with open(self.index_path, 'r') as fp:
+                data = json.load(fp, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            return self
+
+        if not isinstance(data, dict):
+            return self
+        if data.get('version') != INDEX_VERSION or data.get('components_dir') != self.components_dir:
+            return self
+
+        self.entries = data.get('entries', OrderedDict())
+        return self
+
+    def save(self):
+        data = OrderedDict([
+            ('version', INDEX_VERSION),
+            ('components_dir', self.components_dir),
+            ('entries', self.entries),
+        ])
+        with atomic_write(self.index_path) as fp:
+            json.dump(data, fp, separators=(',', ':'))
+        self.changed = False
+        return self
+
+    def _make_entry(self, dir_name, manifest, hooks_dir_existed):
+        if not manifest or not isinstance(manifest, dict):
+            manifest = None
+        elif not manifest.get('id', ''):
+            manifest['id'] = dir_name.lower().replace("-", '_')
+
+        return OrderedDict([
+            ('manifest', manifest),
+            ('hooks_dir_existed', hooks_dir_existed),
+        ])
+
+    def _parse_entry(self, dir_name, dir_path, manifest_path):
+        with open(manifest_path, "r") as fp:
+            manifest = json.load(fp, object_pairs_hook=OrderedDict)
+
+        return self._make_entry(dir_name, manifest, os.path.exists(os.path.join(dir_path, HOOKS_DIR_NAME)))
+
+    def _scan_bundle(self, bundle_name, bundle_entry, entries):
+        """
+        Add the entries of the components in the bundle to `entries`.
+        """
+        bundle_stamp = _get_stamp(bundle_entry.stat())
+        prefix = bundle_name + os.sep
+        cached = OrderedDict(
+            (key, entry) for key, entry in self.entries.items()
+            if entry.get('bundle') == bundle_name and key.startswith(prefix)
+        )
+
+        if cached and all(entry.get('stamp', [None])[0] == bundle_stamp for entry in cached.values()):
+            items = cached.items()
+        else:
+            try:
+                bundle = get_bundle(bundle_entry.path)
+            except OSError:
+                return
+            items = []
+            for dir_name in bundle.get_dir_names(MANIFEST_NAME):
+                if not dir_name.isidentifier():
+                    continue
+                info = bundle.infos['{dir_name}/{manifest}'.format(dir_name=dir_name, manifest=MANIFEST_NAME)]
+                stamp = [bundle_stamp, [info.CRC, info.file_size]]
+                key = os.path.join(bundle_name, dir_name)
+                entry = cached.get(key, None)
+                if entry is None or entry.get('stamp', [None, None])[1] != stamp[1]:
+                    manifest = json.loads(
+                        bundle.read(info.filename).decode('utf-8'),
+                        object_pairs_hook=OrderedDict,
+                    )
+                    entry = self._make_entry(dir_name, manifest, bundle.is_dir(
+                        '{dir_name}/{hooks}'.format(dir_name=dir_name, hooks=HOOKS_DIR_NAME)))
+                    entry['bundle'] = bundle_name
+                self.changed = self.changed or entry.get('stamp') != stamp
+                entry['stamp'] = stamp
+                items.append((key, entry))
+
+        entries.update(items)
+
+    def scan(self):
+        """
+        Update the index with one `os.scandir` pass over the components
+        directory, return the `(dir_name, entry)` pairs of the components.
+        """
+        entries = OrderedDict()
+        bundle_entries = []
+
+        with os.scandir(self.components_dir) as iterator:
+            for dir_entry in iterator:
+                dir_name = dir_entry.name
+                if is_bundle_name(dir_name) and dir_entry.is_file():
+                    bundle_entries.append(dir_entry)
+                    continue
+                if not dir_name.isidentifier():
+                    continue
+                if not dir_entry.is_dir():
+                    continue
+
+                manifest_path = os.path.join(dir_entry.path, MANIFEST_NAME)
+                try:
+                    manifest_stat = os.stat(manifest_path)
+                except FileNotFoundError:
+                    continue
+
+                stamp = [_get_stamp(dir_entry.stat()), _get_stamp(manifest_stat)]
+                entry = self.entries.get(dir_name, None)
+                if entry is None or entry.get('stamp') != stamp:
+                    entry = self._parse_entry(dir_name, dir_entry.path, manifest_path)
+                    entry['stamp'] = stamp
+                    self.changed = True
+
+                entries[dir_name] = entry
+
+        for bundle_entry in sorted(bundle_entries, key=lambda e: e.name):
+            self._scan_bundle(bundle_entry.name, bundle_entry, entries)
+
+        if list(entries.keys()) != list(self.entries.keys()):
+            self.changed = True
+
+        self.entries = entries
+
+        components = []
+        found = set()
+        for dir_name, entry in entries.items():
+            name = dir_name.rpartition(os.sep)[2]
+            if name in found:
+                continue
+            found.add(name)
+            if entry['manifest']:
+                components.append((dir_name, entry))
+        return components
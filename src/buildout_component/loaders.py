@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import hashlib
+import importlib
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import shutil
+import sys
+import threading
+import types
+
+from buildout_component.bundles import get_file_stamp, path_exists, path_is_dir, read_file
+from buildout_component.utils import atomic_write
+
+HOOKS_DIR_NAME = "hooks"
+HOOKS_MODULE_FILE_NAME = 'hooks.py'
+# The module name of `hooks.py`, the `hooks` name is the package of the
+# option hooks.
+HOOKS_MODULE_NAME = '_hooks'
+HOOK_FUNC_NAME = 'setup_option'
+HOOK_FUNC_PREFIX = 'setup_'
+HOOK_REGISTRY_NAME = 'HOOKS'
+BYTECODE_CACHE_DIR_NAME = 'bytecode'
+
+
+class HookLoader(object):
+    """
+    Import the option hook modules of components.
+
+    By default the hooks are imported by the import system and the
+    `__pycache__` directories are removed after the hooks ran. When the
+    `cache_dir` is given, the compiled hooks are kept in that directory, keyed
+    by the source hash and the Python version, instead.
+
+    A component can define all its hooks in one component hook module,
+    `hooks/__init__.py` or `hooks.py`: the `HOOKS` dict maps the option names
+    to the hook functions, or the module defines `setup_<option>` functions.
+    It is imported once for the options, the options it does not define fall
+    back to their `hooks/<option>.py` files.
+
+    The hooks of a component in a zip bundle are read from the bundle, the
+    package of the component is registered with its path in the bundle.
+    """
+
+    def __init__(self, components_dir, cache_dir=None):
+        self.components_dir = components_dir
+        self.module_name_prefix = os.path.basename(os.path.abspath(components_dir))
+        self.cache_dir = cache_dir
+
+    def get_module_name(self, manifest, option_name):
+        return '{module_name}.{component}.{hooks}.{option_name}'.format(
+            module_name=self.module_name_prefix,
+            hooks=HOOKS_DIR_NAME,
+            component=manifest.id,
+            option_name=option_name,
+        )
+
+    def get_component_package_name(self, manifest):
+        return '{module_name}.{component}'.format(
+            module_name=self.module_name_prefix,
+            component=manifest.id,
+        )
+
+    def get_component_module_name(self, manifest):
+        return '{module_name}.{component}.{hooks}'.format(
+            module_name=self.module_name_prefix,
+            hooks=HOOKS_DIR_NAME,
+            component=manifest.id,
+        )
+
+    def get_hooks_module_name(self, manifest):
+        return '{module_name}.{component}.{hooks}'.format(
+            module_name=self.module_name_prefix,
+            hooks=HOOKS_MODULE_NAME,
+            component=manifest.id,
+        )
+
+    def get_hooks_dir(self, manifest):
+        return os.path.join(self.components_dir, manifest.component_dir, HOOKS_DIR_NAME)
+
+    def get_hook_path(self, manifest, option_name):
+        return os.path.join(self.get_hooks_dir(manifest), '{option_name}.py'.format(option_name=option_name))
+
+    def get_component_hook_paths(self, manifest):
+        """
+        Return the candidate files of the component hook module, the
+        `hooks/__init__.py` comes first.
+        """
+        return (
+            os.path.join(self.get_hooks_dir(manifest), '__init__.py'),
+            os.path.join(self.components_dir, manifest.component_dir, HOOKS_MODULE_FILE_NAME),
+        )
+
+    def _get_bytecode_path(self, manifest, option_name, source):
+        return os.path.join(
+            self.cache_dir,
+            BYTECODE_CACHE_DIR_NAME,
+            manifest.id,
+            '{option_name}.{digest}.{tag}.pyc'.format(
+                option_name=option_name,
+                digest=hashlib.sha1(source).hexdigest(),
+                tag=sys.implementation.cache_tag,
+            )
+        )
+
+    def _register_package(self, module_name, path):
+        spec = importlib.machinery.ModuleSpec(module_name, None, is_package=True)
+        spec.submodule_search_locations.append(path)
+        return sys.modules.setdefault(module_name, importlib.util.module_from_spec(spec))
+
+    def _import_bundled(self, manifest, module_name):
+        """
+        Import a module of a bundled component and its parent packages. The
+        directories without `__init__.py` are namespace packages.
+        """
+        module = sys.modules.get(module_name, None)
+        if module is not None:
+            return module
+
+        package_name = self.get_component_package_name(manifest)
+        if module_name == package_name:
+            return self._register_package(package_name, manifest.component_dir)
+
+        parent_name, _, name = module_name.rpartition('.')
+        parent = self._import_bundled(manifest, parent_name)
+        if not hasattr(parent, '__path__'):
+            raise ModuleNotFoundError(
+                "No module named '{name}'; '{parent}' is not a package".format(name=module_name, parent=parent_name),
+                name=module_name,
+            )
+
+        path = os.path.join(parent.__path__[0], name)
+        init_path = os.path.join(path, '__init__.py')
+        if path_exists(init_path):
+            source_path = init_path
+        elif path_exists(path + '.py'):
+            source_path = path + '.py'
+        elif path_is_dir(path):
+            source_path = None
+        else:
+            raise ModuleNotFoundError("No module named '{name}'".format(name=module_name), name=module_name)
+
+        if source_path is None:
+            module = self._register_package(module_name, path)
+        else:
+            spec = importlib.machinery.ModuleSpec(
+                module_name, None, origin=source_path, is_package=source_path == init_path)
+            spec.has_location = True
+            if spec.submodule_search_locations is not None:
+                spec.submodule_search_locations.append(path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            try:
+                exec(compile(read_file(source_path), source_path, 'exec', dont_inherit=True), module.__dict__)
+            except BaseException:
+                del sys.modules[module_name]
+                raise
+
+        setattr(parent, name, module)
+        return module
+
+    def _import(self, manifest, module_name):
+        if manifest.bundle_path:
+            return self._import_bundled(manifest, module_name)
+        return importlib.import_module(module_name)
+
+    def _import_hooks_package(self, manifest):
+        """
+        Import the package of the option hooks, or return None if the
+        component has no `hooks` directory. A directory without `__init__.py`
+        is registered as a namespace package: the import system would import
+        the `hooks.py` beside it instead.
+        """
+        module_name = self.get_component_module_name(manifest)
+        module = sys.modules.get(module_name, None)
+        if module is not None:
+            return module
+
+        init_path, _ = self.get_component_hook_paths(manifest)
+        if path_exists(init_path):
+            if self.cache_dir:
+                return self._load_cached_package(manifest, module_name, init_path)
+            return self._import(manifest, module_name)
+
+        hooks_dir = self.get_hooks_dir(manifest)
+        if not path_is_dir(hooks_dir):
+            return None
+        self._import(manifest, self.get_component_package_name(manifest))
+        return self._register_package(module_name, hooks_dir)
+
+    def _get_code(self, manifest, option_name, hook_path):
+        source = read_file(hook_path)
+
+        bytecode_path = self._get_bytecode_path(manifest, option_name, source)
+        if os.path.exists(bytecode_path):
+            with open(bytecode_path, 'rb') as fp:
+                return marshal.load(fp)
+
+        code = compile(source, hook_path, 'exec', dont_inherit=True)
+
+        with atomic_write(bytecode_path, 'wb') as fp:
+            marshal.dump(code, fp)
+        return code
+
+    def _load_cached_package(self, manifest, module_name, init_path):
+        # Import the component package, so the relative imports in the package work.
+        self._import(manifest, self.get_component_package_name(manifest))
+
+        spec = importlib.util.spec_from_file_location(
+            module_name, init_path, submodule_search_locations=[self.get_hooks_dir(manifest)])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            exec(self._get_code(manifest, '__init__', init_path), module.__dict__)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+    def _load_cached(self, manifest, option_name, module_name):
+        hook_path = self.get_hook_path(manifest, option_name)
+        if not path_exists(hook_path):
+            raise ImportError("No module named '{name}'".format(name=module_name), name=module_name)
+
+        # Import the parent packages, so the relative imports in hooks work.
+        self._import_hooks_package(manifest)
+
+        code = self._get_code(manifest, option_name, hook_path)
+
+        spec = importlib.util.spec_from_file_location(module_name, hook_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+    def load(self, manifest, option_name):
+        module_name = self.get_module_name(manifest, option_name)
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        if self.cache_dir:
+            return self._load_cached(manifest, option_name, module_name)
+        if self._import_hooks_package(manifest) is None:
+            raise ModuleNotFoundError("No module named '{name}'".format(name=module_name), name=module_name)
+        return self._import(manifest, module_name)
+
+    def _load_hooks_module(self, manifest, module_name, hook_path):
+        # Import the component package, so the relative imports in the module work.
+        self._import(manifest, self.get_component_package_name(manifest))
+
+        spec = importlib.util.spec_from_file_location(module_name, hook_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            if self.cache_dir:
+                exec(self._get_code(manifest, HOOKS_MODULE_NAME, hook_path), module.__dict__)
+            elif manifest.bundle_path:
+                exec(compile(read_file(hook_path), hook_path, 'exec', dont_inherit=True), module.__dict__)
+            else:
+                spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+    def load_component(self, manifest):
+        """
+        Return the component hook module, or None if the component has none.
+        The `hooks.py` is imported by its path as `<component>._hooks`, so the
+        `hooks` directory is still the package of the option hooks.
+        """
+        hooks_module_name = self.get_hooks_module_name(manifest)
+        if hooks_module_name in sys.modules:
+            return sys.modules[hooks_module_name]
+
+        module_name = self.get_component_module_name(manifest)
+        package = sys.modules.get(module_name, None)
+        if package is not None and getattr(package, '__file__', None):
+            return package
+
+        init_path, hooks_module_path = self.get_component_hook_paths(manifest)
+        if path_exists(init_path):
+            return self._import_hooks_package(manifest)
+        if path_exists(hooks_module_path):
+            return self._load_hooks_module(manifest, hooks_module_name, hooks_module_path)
+        return None
+
+    def get_component_handler(self, module, option_name):
+        registry = getattr(module, HOOK_REGISTRY_NAME, None)
+        if registry is not None and option_name in registry:
+            return registry[option_name]
+        return getattr(module, HOOK_FUNC_PREFIX + option_name, None)
+
+    def get_handler(self, manifest, option_name, component_module=None):
+        """
+        Return the hook function of the option, from the component hook
+        module if it defines one, or from the option hook module.
+        """
+        if component_module is not None:
+            handler = self.get_component_handler(component_module, option_name)
+            if handler is not None:
+                return handler
+        return getattr(self.load(manifest, option_name), HOOK_FUNC_NAME, None)
+
+    def unload(self, manifest, option_name=None):
+        """
+        Forget the loaded hook modules of the component, so they are loaded
+        again from the changed sources.
+        """
+        if option_name is not None:
+            module_names = [self.get_module_name(manifest, option_name)]
+        else:
+            prefix = self.get_module_name(manifest, '')
+            module_names = [name for name in list(sys.modules) if name.startswith(prefix)]
+            module_names.append(self.get_component_module_name(manifest))
+            module_names.append(self.get_hooks_module_name(manifest))
+            if manifest.bundle_path:
+                module_names.append(self.get_component_package_name(manifest))
+
+        for module_name in module_names:
+            sys.modules.pop(module_name, None)
+        importlib.invalidate_caches()
+
+    def cleanup(self, manifest, option_name=None):
+        """
+        Remove the files compiled by the import system, the hooks do not
+        write them with the `cache_dir`, but the modules they import do.
+        """
+        hooks_dir = self.get_hooks_dir(manifest)
+        if option_name is not None:
+            hook_file = os.path.join(hooks_dir, '{option_name}.pyc'.format(option_name=option_name))
+            if os.path.exists(hook_file):
+                os.remove(hook_file)
+            return
+
+        py_cache_dir = os.path.join(hooks_dir, '__pycache__')
+        if os.path.exists(py_cache_dir):
+            shutil.rmtree(py_cache_dir, False)
+
+        _, hooks_module_path = self.get_component_hook_paths(manifest)
+        hooks_module_cache = importlib.util.cache_from_source(hooks_module_path)
+        if os.path.exists(hooks_module_cache):
+            os.remove(hooks_module_cache)
+            try:
+                os.rmdir(os.path.dirname(hooks_module_cache))
+            except OSError:
+                pass
+
+
+class IsolatedHookLoader(HookLoader):
+    """
+    Import the option hooks without touching the interpreter state, the
+    modules are kept in the loader instead of `sys.modules` and `sys.path`
+    is not needed. The hooks in bundles are read from the bundles.
+
+    A loaded hook is reused until its file changes, so the loader can serve
+    many builds. The hooks can not import the other modules of their
+    component package relatively.
+    """
+
+    def __init__(self, components_dir):
+        super().__init__(components_dir)
+        self.modules = {}
+        self._lock = threading.Lock()
+
+    def _load_file(self, module_name, hook_path, stamp, package):
+        stamp = (hook_path, stamp)
+        loaded = self.modules.get(module_name, None)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+        code = compile(read_file(hook_path), hook_path, 'exec', dont_inherit=True)
+
+        module = types.ModuleType(module_name)
+        module.__file__ = hook_path
+        module.__package__ = package
+        exec(code, module.__dict__)
+
+        with self._lock:
+            self.modules[module_name] = (stamp, module)
+        return module
+
+    def load(self, manifest, option_name):
+        module_name = self.get_module_name(manifest, option_name)
+        hook_path = self.get_hook_path(manifest, option_name)
+        try:
+            stamp = get_file_stamp(hook_path)
+        except OSError:
+            raise ImportError("No module named '{name}'".format(name=module_name), name=module_name)
+
+        return self._load_file(module_name, hook_path, stamp, module_name.rpartition('.')[0])
+
+    def load_component(self, manifest):
+        module_name = self.get_component_module_name(manifest)
+        for hook_path in self.get_component_hook_paths(manifest):
+            try:
+                stamp = get_file_stamp(hook_path)
+            except OSError:
+                continue
+            package = module_name if hook_path.endswith('__init__.py') else module_name.rpartition('.')[0]
+            return self._load_file(module_name, hook_path, stamp, package)
+        return None
+
+    def unload(self, manifest, option_name=None):
+        if option_name is not None:
+            module_names = [self.get_module_name(manifest, option_name)]
+        else:
+            prefix = self.get_module_name(manifest, '')
+            module_names = [name for name in list(self.modules) if name.startswith(prefix)]
+            module_names.append(self.get_component_module_name(manifest))
+
+        with self._lock:
+            for module_name in module_names:
+                self.modules.pop(module_name, None)
+
+    def cleanup(self, manifest, option_name=None):
+        # Nothing is written beside the hooks.
+        pass
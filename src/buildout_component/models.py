@@ -5,7 +5,8 @@
 # All rights reserved by Cd Chen.
 #
 import os
-from collections import OrderedDict, UserList
+from collections import OrderedDict
+from types import MappingProxyType
 
 from buildout_component.utils import SimpleMapping
 
@@ -15,26 +16,38 @@ OPTION_NAME_SEPARATOR = '.'
 class Manifest(object):
     """
     The component's manifest data class.
+
+    The fields are slots, the other keys of `manifest.json` are kept in the
+    `__dict__`, which is created only for them.
     """
-    id = ""
-    title = ""
-    section = ""
-    options = []
-    defaults = {}
-    dependencies = []
-    disabled = False
-
-    component_dir = ""
-    manifest_path = ""
-    hooks_dir_existed = False
+    __slots__ = (
+        'id', 'title', 'section', 'options', 'defaults', 'dependencies', 'disabled', 'cacheable',
+        'component_dir', 'manifest_path', 'hooks_dir_existed', 'bundle_path', 'resources_dir',
+        '__dict__',
+    )
+
+    def __init__(self, id="", title="", section="", options=None, defaults=None, dependencies=None,
+                 disabled=False, cacheable=True, component_dir="", manifest_path="", hooks_dir_existed=False,
+                 bundle_path="", resources_dir="", **kwargs):
+        self.id = id
+        self.title = title
+        self.section = section or id
+        self.options = options if options is not None else []
+        self.defaults = defaults if defaults is not None else {}
+        self.dependencies = dependencies if dependencies is not None else []
+        self.disabled = disabled
+        self.cacheable = cacheable
+        self.component_dir = component_dir
+        self.manifest_path = manifest_path
+        self.hooks_dir_existed = hooks_dir_existed
+        # The zip bundle of the component, see `bundles`.
+        self.bundle_path = bundle_path
+        # The directory `join` extracts the files of a bundled component into.
+        self.resources_dir = resources_dir
 
-    def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-        if not self.section:
-            self.section = self.id
-
     def __hash__(self):
         return hash(self.id)
 
@@ -46,7 +59,25 @@ class Manifest(object):
         )
 
     def join(self, filename):
-        return os.path.join(self.component_dir, filename)
+        """
+        Return the path of a file of the component. The file of a bundled
+        component is extracted into the `resources_dir`, so buildout and the
+        other tools can open it.
+        """
+        path = os.path.join(self.component_dir, filename)
+        if self.bundle_path and self.resources_dir:
+            from buildout_component.bundles import extract_file
+
+            return extract_file(path, self.resources_dir)
+        return path
+
+    def to_dict(self):
+        """
+        Return all the fields and the other keys.
+        """
+        data = dict((key, getattr(self, key)) for key in self.__slots__ if key != '__dict__')
+        data.update(self.__dict__)
+        return data
 
     def serialize(self):
         return {
@@ -61,50 +92,76 @@ class Manifest(object):
 
 
 class Options(SimpleMapping):
+    """
+    The options of components.
+
+    The values are kept by the flat `<component>.<name>` keys in `_data`, and
+    indexed by component in the two-level `_group_by` dict; the keys are split
+    once. The `flat_dict` and `group_by` are read-only views, not copies.
+    """
+    __slots__ = ('_group_by', '_keys')
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._group_by = OrderedDict()
+        super().__init__()
+        self._group_by = {}
+        self._keys = {}
+        self.update(*args, **kwargs)
+
+    def __getstate__(self):
+        return {'_data': self._data}
+
+    def __setstate__(self, state):
+        # The pickles of the old versions also keep the `_group_by`, rebuild
+        # the index from the flat data instead.
+        self._data = OrderedDict()
+        self._group_by = {}
+        self._keys = {}
+        for key, value in state.get('_data', {}).items():
+            self[key] = value
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, value)
-        manifest, key = self.split_key(key)
-        self._sync_group_by(manifest, key, value)
+        keys = self._keys.get(key, None)
+        if keys is None:
+            keys = self._keys[key] = self.split_key(key)
+        self._data[key] = value
+        self._sync_group_by(keys[0], keys[1], value)
 
     def __delitem__(self, key):
-        manifest, key = self.split_key(key)
-        if manifest in self._group_by:
-            del self._group_by[manifest][key]
+        del self._data[key]
+        manifest, key = self._keys.pop(key)
+        group = self._group_by[manifest]
+        del group[key]
+        if not group:
+            del self._group_by[manifest]
 
     def _sync_group_by(self, manifest, key, value):
-        if manifest not in self._group_by:
-            self._group_by[manifest] = OrderedDict()
-        self._group_by[manifest][key] = value
+        group = self._group_by.get(manifest, None)
+        if group is None:
+            group = self._group_by[manifest] = {}
+        group[key] = value
 
     def split_key(self, key):
-        if OPTION_NAME_SEPARATOR in key:
-            key = key.split(OPTION_NAME_SEPARATOR)
-            return (key[0], ''.join(key[1:]))
-        return ("", key)
+        manifest, separator, key = key.partition(OPTION_NAME_SEPARATOR)
+        if not separator:
+            return ("", manifest)
+        return (manifest, key)
 
     def get_key(self, manifest, key):
-        return '{manifest}{separator}{key}'.format(
-            manifest=manifest,
-            separator=OPTION_NAME_SEPARATOR,
-            key=key
-        )
+        return manifest + OPTION_NAME_SEPARATOR + key
 
     def put(self, manifest, key, value):
+        flat_key = self.get_key(manifest, key)
+        self._keys[flat_key] = (manifest, key)
+        self._data[flat_key] = value
         self._sync_group_by(manifest, key, value)
-        key = self.get_key(manifest, key)
-        self._data[key] = value
 
     @property
     def flat_dict(self):
-        return OrderedDict(self._data)
+        return MappingProxyType(self._data)
 
     @property
     def group_by(self):
-        return OrderedDict(self._group_by)
+        return MappingProxyType(self._group_by)
 
 
 class ConfigOptions(object):
@@ -122,15 +179,25 @@ class ConfigItem(object):
     """
     The value of Config.
     """
+    __slots__ = ()
 
 
-class ConfigList(ConfigItem, UserList):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+class ConfigList(ConfigItem, list):
+    __slots__ = ('allow_duplicate',)
+
+    def __init__(self, *args):
+        super().__init__(*args)
         self.allow_duplicate = False
 
+    @property
+    def data(self):
+        # The list itself, as the `data` of the former `UserList` base.
+        return self
+
 
 class ConfigComment(ConfigItem):
+    __slots__ = ('data',)
+
     def __init__(self, data):
         self.data = data
 
@@ -148,21 +215,36 @@ class ConfigComment(ConfigItem):
 
 
 class ConfigSection(SimpleMapping):
-    def __init__(self, *args, **kwargs):
-        super().__init__()
+    """
+    The section of config, every value is a `ConfigList`.
 
+    The `merge(..., share=True)` borrows the lists of another section instead
+    of copying them, a borrowed list is copied when it is extended
+    (copy-on-write).
+    """
+    __slots__ = ('_shared', 'operators', 'section')
+
+    def __init__(self, *args, **kwargs):
+        # The plain dicts keep the insertion order too.
+        self._data = {}
+        self._shared = None
+        self.section = None
         another = dict(*args, **kwargs)
         for key, value in another.items():
-            self[key] = self._merge_item(key, value)
-        self.operators = OrderedDict()
-        self.operators.setdefault('parts', '+=')
+            self._data[key] = self._merge_item(key, value)
+        self.operators = {'parts': '+='}
 
     def add_comment(self, value):
         value = ConfigComment(value)
         self._data[value] = value
 
     def _merge_item(self, key, value):
-        existed = self._data.get(key, ConfigList())
+        existed = self._data.get(key, None)
+        if existed is None:
+            existed = ConfigList()
+        elif self._shared and key in self._shared:
+            existed = ConfigList(existed)
+            self._shared.discard(key)
 
         if isinstance(value, (tuple, list, ConfigList)):
             existed.extend(value)
@@ -176,47 +258,88 @@ class ConfigSection(SimpleMapping):
             value = self._merge_item(key, value)
         super().__setitem__(key, value)
 
-    def merge(self, another):
+    def merge(self, another, share=False):
         if isinstance(another, (tuple, list)):
             another = dict(another)
         elif not isinstance(another, (dict, RootConfig, ConfigSection)):
             return
 
-        all_keys = set(self.keys()) | set(another.keys())
+        data = self._data
+        items = another._data.items() if isinstance(another, SimpleMapping) else another.items()
+        for key, value in items:
+            if share and key not in data and type(value) is ConfigList and not value.allow_duplicate:
+                data[key] = value
+                if self._shared is None:
+                    self._shared = set()
+                self._shared.add(key)
+            else:
+                data[key] = self._merge_item(key, value)
 
-        for key in self.keys():
-            if key in another:
-                a_value = another.get(key)
-                self.__setitem__(key, a_value)
-            all_keys.remove(key)
 
-        for key in all_keys:
-            if key in another:
-                a_value = another.get(key)
-                self.__setitem__(key, a_value)
+class BaseRootConfig(SimpleMapping):
+    __slots__ = ()
 
+    # The class of the sections created on access.
+    section_class = ConfigSection
 
-class BaseRootConfig(SimpleMapping):
+    def __contains__(self, item):
+        # Do not create the section as `__getitem__` does.
+        return item in self._data
 
     def __getitem__(self, item):
         data = self._data
         if not item in data:
-            section = ConfigSection()
+            section = self.section_class()
             section.section = item
             data[item] = section
         return data[item]
 
     def __setitem__(self, key, value):
         if not isinstance(value, ConfigSection):
-            value = ConfigSection(value)
+            value = self.section_class(value)
         value.section = key
         self[key].merge(value)
 
 
 class RootConfig(BaseRootConfig):
+    __slots__ = ('manifest',)
+
     def __init__(self, manifest, *args, **kwargs):
         assert manifest is not None, "The `manifest` argument is required."
         assert isinstance(manifest, Manifest), "The `manifest` argument must be instance of `Manifest`"
 
         self.manifest = manifest
         super().__init__(*args, **kwargs)
+
+
+class FinalRootConfig(BaseRootConfig):
+    """
+    The config merged from the configs of all components.
+    """
+    __slots__ = ()
+
+    def merge(self, another):
+        if isinstance(another, (tuple, list)):
+            another = dict(another)
+        elif not isinstance(another, (dict, BaseRootConfig, ConfigSection)):
+            return
+
+        data = self._data
+        items = another._data.items() if isinstance(another, SimpleMapping) else another.items()
+        for key, section in items:
+            my_section = data.get(key, None)
+            if my_section is None:
+                # Borrow the lists of the new section until they change.
+                self[key].merge(section, share=True)
+            else:
+                my_section.merge(section)
+
+    def iter_render(self, padding=4):
+        from buildout_component.renderers import ConfigRenderer
+
+        return ConfigRenderer(padding).iter_render(self)
+
+    def render(self, padding=4):
+        from buildout_component.renderers import ConfigRenderer
+
+        return ConfigRenderer(padding).render(self)
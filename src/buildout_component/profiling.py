@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import contextlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+HOOK_PROFILERS = ('cprofile', 'tracemalloc')
+
+_null_context = contextlib.nullcontext()
+
+
+class Span(object):
+    __slots__ = ('name', 'category', 'start', 'wall', 'cpu', 'thread_id', 'args')
+
+    def __init__(self, name, category, start, wall, cpu, thread_id, args):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        self.thread_id = thread_id
+        self.args = args
+
+
+class Profiler(object):
+    """
+    Record the wall and CPU time of the phases of a run.
+
+    The spans can be exported as the Chrome trace-event JSON (open it with
+    `chrome://tracing` or Perfetto) and as a text summary. The `hook_profiler`
+    captures a `cProfile` profile or the `tracemalloc` allocations per hook.
+    """
+
+    def __init__(self, enabled=True, hook_profiler=None):
+        self.enabled = enabled
+        self.hook_profiler = hook_profiler if enabled else None
+        self.hook_profiles = OrderedDict()
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.hook_profiles = OrderedDict()
+        self.spans = []
+        self.origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def _span(self, name, category, args):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield args
+        finally:
+            span = Span(
+                name,
+                category,
+                start - self.origin,
+                time.perf_counter() - start,
+                time.thread_time() - cpu_start,
+                threading.get_ident(),
+                args,
+            )
+            with self._lock:
+                self.spans.append(span)
+
+    def record(self, name, category, start, wall, cpu, **args):
+        """
+        Add a span measured elsewhere, like in a worker process, `start` is a
+        `time.perf_counter()` of this process.
+        """
+        if not self.enabled:
+            return
+        span = Span(name, category, start - self.origin, wall, cpu, threading.get_ident(), args)
+        with self._lock:
+            self.spans.append(span)
+
+    def span(self, name, category='phase', **args):
+        if not self.enabled:
+            return _null_context
+        return self._span(name, category, args)
+
+    @contextlib.contextmanager
+    def _capture_cprofile(self, name):
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self.hook_profiles[name] = profile
+
+    @contextlib.contextmanager
+    def _capture_tracemalloc(self, name, args):
+        import tracemalloc
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            args['allocated'] = current - before
+            args['peak'] = peak - before
+            if started:
+                tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def _capture(self, name, category, args):
+        with self._span(name, category, args):
+            if self.hook_profiler == 'cprofile':
+                with self._capture_cprofile(name):
+                    yield
+            elif self.hook_profiler == 'tracemalloc':
+                with self._capture_tracemalloc(name, args):
+                    yield
+            else:
+                yield
+
+    def capture(self, name, category='hook', **args):
+        """
+        Like `span`, and also run the hook profiler.
+        """
+        if not self.enabled:
+            return _null_context
+        return self._capture(name, category, args)
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.args)
+            args['cpu_ms'] = round(span.cpu * 1000, 3)
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': round(span.start * 1000000, 3),
+                'dur': round(span.wall * 1000000, 3),
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path):
+        import json
+
+        with open(path, 'w') as fp:
+            json.dump(self.to_chrome_trace(), fp)
+
+    def write_hook_profiles(self, directory):
+        if not self.hook_profiles:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for name, profile in self.hook_profiles.items():
+            profile.dump_stats(os.path.join(directory, '{name}.prof'.format(name=name)))
+
+    def summary(self):
+        """
+        Return the text summary, the totals by `(category, name)` sorted by
+        the wall time.
+        """
+        totals = OrderedDict()
+        for span in self.spans:
+            total = totals.setdefault((span.category, span.name), [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += span.wall
+            total[2] += span.cpu
+
+        lines = ['{category:<10} {name:<40} {count:>6} {wall:>12} {cpu:>12}'.format(
+            category='CATEGORY', name='NAME', count='COUNT', wall='WALL (ms)', cpu='CPU (ms)',
+        )]
+        for (category, name), (count, wall, cpu) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append('{category:<10} {name:<40} {count:>6} {wall:>12.3f} {cpu:>12.3f}'.format(
+                category=category,
+                name=name,
+                count=count,
+                wall=wall * 1000,
+                cpu=cpu * 1000,
+            ))
+        return '\n'.join(lines)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+from collections import OrderedDict
+
+from buildout_component.models import ConfigList, ConfigSection
+
+COMPONENT_SECTION_NAME_IN_CONFIG = 'buildout_component'
+
+# The operators forced on the keys of a section, whatever the components set.
+SECTION_OPERATORS = {
+    'buildout': {
+        'eggs': '+=',
+        'parts': '+=',
+    },
+}
+
+
+class ConfigRenderer(object):
+    """
+    Render the config models to the lines of `buildout.cfg`.
+
+    The `[buildout]` and `[versions]` sections come first and the
+    `[buildout_component]` section comes last, they are rendered even when
+    they are empty. A blank line follows every section.
+    """
+
+    first_sections = ('buildout', 'versions')
+    last_sections = (COMPONENT_SECTION_NAME_IN_CONFIG,)
+
+    def __init__(self, padding=4, template=''):
+        self.padding = ' ' * padding
+        self.template = template or '{key} {operator} {values}'
+        self.value_separator = '\n{padding}'.format(padding=self.padding)
+
+    def render_key(self, section, key, value):
+        return key
+
+    def render_value(self, section, key, value):
+        if isinstance(value, (tuple, list, ConfigList)):
+            if getattr(value, 'allow_duplicate', False):
+                # If `allow_duplicate` is False.
+                value = list(OrderedDict.fromkeys(value))
+            return [self.render_value(section, key, v) for v in value]
+
+        return str(value).strip() if value is not None else ''
+
+    def render_operator(self, section, key, value):
+        operators = SECTION_OPERATORS.get(section.section, None)
+        if operators is not None and key in operators:
+            return operators[key]
+        return section.operators.get(key, '=')
+
+    def iter_render_section(self, section):
+        yield '[{section}]'.format(section=section.section)
+
+        padding = self.padding
+        template = self.template
+        value_separator = self.value_separator
+
+        for key, value in section._data.items():
+            key = self.render_key(section, key, value)
+            operator = self.render_operator(section, key, value)
+            value = self.render_value(section, key, value)
+            if isinstance(value, (tuple, list, ConfigList)):
+                values = value
+            elif isinstance(value, dict):
+                values = list(value.items())
+            else:
+                values = [value]
+            if len(values) > 1:
+                values.insert(0, padding)
+                value = value_separator.join(values)
+            else:
+                value = ''.join(values)
+            yield template.format(
+                key=key,
+                operator=operator,
+                values=value,
+            )
+
+    def render_section(self, section):
+        return list(self.iter_render_section(section))
+
+    def _get_section(self, config, name):
+        section = config._data.get(name, None)
+        if section is None:
+            # The first and last sections are always rendered, with an empty
+            # body when they are absent.
+            section = ConfigSection()
+            section.section = name
+        return section
+
+    def _iter_render_lines(self, config):
+        for name in self.first_sections:
+            yield from self.iter_render_section(self._get_section(config, name))
+            yield '\n'
+
+        skipped = self.first_sections + self.last_sections
+        for name, section in config._data.items():
+            if name in skipped:
+                continue
+            yield from self.iter_render_section(section)
+            yield '\n'
+
+        for name in self.last_sections:
+            yield from self.iter_render_section(self._get_section(config, name))
+            yield '\n'
+
+    def iter_render(self, config):
+        """
+        Yield the rendered config piece by piece, the sections are rendered
+        only when they are consumed.
+        """
+        lines = self._iter_render_lines(config)
+        for line in lines:
+            yield line
+            break
+        for line in lines:
+            yield '\n'
+            yield line
+
+    def render(self, config):
+        return ''.join(self.iter_render(config))
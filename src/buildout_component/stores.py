@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import contextlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict, UserList
+
+from buildout_component.models import Options, ConfigComment, ConfigList, ConfigSection, RootConfig
+
+STATE_FILE_SUFFIX = '.options.db'
+TYPE_KEY = '__type__'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS options (
+    component TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (component, key)
+);
+CREATE TABLE IF NOT EXISTS configs (
+    component TEXT NOT NULL PRIMARY KEY,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _tagged(type_name, value):
+    return {TYPE_KEY: type_name, 'value': value}
+
+
+def encode_value(value):
+    """
+    Convert the option value to JSON compatible data, the types that JSON does
+    not support are tagged with `__type__`. The other types are pickled, a
+    value that can not be pickled raises `TypeError`.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, UserList)):
+        return [encode_value(v) for v in value]
+    if isinstance(value, tuple):
+        return _tagged('tuple', [encode_value(v) for v in value])
+    if isinstance(value, (set, frozenset)):
+        return _tagged(value.__class__.__name__, [encode_value(v) for v in value])
+    if isinstance(value, dict):
+        if TYPE_KEY not in value and all(isinstance(k, str) for k in value):
+            return OrderedDict((k, encode_value(v)) for k, v in value.items())
+        return _tagged('dict', [[encode_value(k), encode_value(v)] for k, v in value.items()])
+
+    # Import the modules of the less common types on demand, `show-options`
+    # rarely needs them.
+    import base64
+    import datetime
+    import decimal
+
+    if isinstance(value, datetime.datetime):
+        return _tagged('datetime', value.isoformat())
+    if isinstance(value, datetime.date):
+        return _tagged('date', value.isoformat())
+    if isinstance(value, datetime.time):
+        return _tagged('time', value.isoformat())
+    if isinstance(value, datetime.timedelta):
+        return _tagged('timedelta', [value.days, value.seconds, value.microseconds])
+    if isinstance(value, decimal.Decimal):
+        return _tagged('decimal', str(value))
+    if isinstance(value, bytes):
+        return _tagged('bytes', base64.b64encode(value).decode('ascii'))
+
+    import pickle
+
+    try:
+        data = pickle.dumps(value)
+    except Exception as exc:
+        raise TypeError("Can not store the value of type `{type}`: {exc}".format(
+            type=value.__class__.__name__,
+            exc=exc,
+        ))
+    return _tagged('pickle', base64.b64encode(data).decode('ascii'))
+
+
+def decode_value(data):
+    if isinstance(data, list):
+        return [decode_value(v) for v in data]
+    if not isinstance(data, dict):
+        return data
+    if TYPE_KEY not in data:
+        return dict((k, decode_value(v)) for k, v in data.items())
+
+    type_name, value = data[TYPE_KEY], data.get('value')
+    if type_name == 'tuple':
+        return tuple(decode_value(v) for v in value)
+    if type_name == 'set':
+        return set(decode_value(v) for v in value)
+    if type_name == 'frozenset':
+        return frozenset(decode_value(v) for v in value)
+    if type_name == 'dict':
+        return dict((decode_value(k), decode_value(v)) for k, v in value)
+
+    import base64
+    import datetime
+    import decimal
+
+    if type_name == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    if type_name == 'date':
+        return datetime.date.fromisoformat(value)
+    if type_name == 'time':
+        return datetime.time.fromisoformat(value)
+    if type_name == 'timedelta':
+        return datetime.timedelta(*value)
+    if type_name == 'decimal':
+        return decimal.Decimal(value)
+    if type_name == 'bytes':
+        return base64.b64decode(value)
+    if type_name == 'pickle':
+        import pickle
+
+        return pickle.loads(base64.b64decode(value))
+    # The `repr` of the unknown types stored by the old versions.
+    return value
+
+
+def _encode_config_value(value):
+    # The config values are rendered by `str()`, keep what the render needs.
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (tuple, list, UserList)):
+        return [_encode_config_value(v) for v in value]
+    return str(value)
+
+
+def encode_config(config):
+    """
+    Convert the `RootConfig` of a component to JSON compatible data.
+    """
+    sections = []
+    for name, section in config.items():
+        items = []
+        for key, value in section.items():
+            if isinstance(key, ConfigComment):
+                items.append([None, key.data, False])
+            else:
+                items.append([key, _encode_config_value(value), getattr(value, 'allow_duplicate', False)])
+        sections.append([name, items, list(section.operators.items())])
+    return sections
+
+
+def decode_config(manifest, data):
+    config = RootConfig(manifest)
+    for name, items, operators in data:
+        section = ConfigSection()
+        section.section = name
+        for key, value, allow_duplicate in items:
+            if key is None:
+                section.add_comment(value)
+                continue
+            value = ConfigList(value if isinstance(value, list) else [value])
+            value.allow_duplicate = allow_duplicate
+            section._data[key] = value
+        section.operators = dict(operators)
+        config._data[name] = section
+    return config
+
+
+def get_state_path(output_file):
+    return '{output_file}{suffix}'.format(output_file=output_file, suffix=STATE_FILE_SUFFIX)
+
+
+class OptionStore(object):
+    """
+    The sidecar state file of the collected options.
+
+    The options are kept in a `sqlite3` table keyed by `(component, key)`, so
+    one option can be read without decoding the others.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            # The tables are created on open, an empty state file reads as no
+            # options.
+            connection.executescript(_SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, component, key, default=None):
+        if not self.exists():
+            return default
+
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT value FROM options WHERE component = ? AND key = ?',
+                (component, key)
+            ).fetchone()
+        if row is None:
+            return default
+        return decode_value(json.loads(row[0]))
+
+    def get_component(self, component):
+        options = OrderedDict()
+        if not self.exists():
+            return options
+
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT key, value FROM options WHERE component = ? ORDER BY position',
+                (component,)
+            )
+            for key, value in rows:
+                options[key] = decode_value(json.loads(value))
+        return options
+
+    def load(self):
+        options = Options()
+        if not self.exists():
+            return options
+
+        with self._connect() as connection:
+            rows = connection.execute('SELECT component, key, value FROM options ORDER BY position')
+            for component, key, value in rows:
+                options.put(component, key, decode_value(json.loads(value)))
+        return options
+
+    def load_configs(self, manifests):
+        """
+        Return the stored `{id: RootConfig}` of the given `{id: Manifest}`.
+        """
+        configs = OrderedDict()
+        if not self.exists():
+            return configs
+
+        with self._connect() as connection:
+            rows = connection.execute('SELECT component, value FROM configs ORDER BY position')
+            for component, value in rows:
+                if component in manifests:
+                    configs[component] = decode_config(manifests[component], json.loads(value))
+        return configs
+
+    def save(self, options, configs=None):
+        """
+        Replace the stored options and the `{id: RootConfig}` configs, return
+        False if nothing changed.
+        """
+        rows = []
+        for component, component_options in options.group_by.items():
+            for key, value in component_options.items():
+                rows.append((component, key, len(rows), json.dumps(encode_value(value))))
+
+        config_rows = []
+        for component, config in (configs or {}).items():
+            config_rows.append((component, len(config_rows), json.dumps(encode_config(config))))
+
+        with self._connect() as connection:
+            existed = connection.execute(
+                'SELECT component, key, position, value FROM options ORDER BY position'
+            ).fetchall()
+            existed_configs = connection.execute(
+                'SELECT component, position, value FROM configs ORDER BY position'
+            ).fetchall()
+            if existed == rows and existed_configs == config_rows:
+                return False
+
+            connection.execute('DELETE FROM options')
+            connection.executemany(
+                'INSERT INTO options (component, key, position, value) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            connection.execute('DELETE FROM configs')
+            connection.executemany(
+                'INSERT INTO configs (component, position, value) VALUES (?, ?, ?)',
+                config_rows
+            )
+        return True
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+"""
+Track what every option hook reads and writes, so a hook runs again only
+when its source or a value it read changed; the recorded config changes and
+result of the other hooks are replayed.
+
+The reads are the keys of `context.defaults`, the options and configs of
+other components read by `context.get_collected_option()` and
+`context.get_collected_config()`, and the sections and keys of its own
+config. The other inputs of a hook, like files, the environment or the time,
+are not tracked: such a component needs `"cacheable": false` in its
+manifest.
+"""
+import copy
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from buildout_component.models import ConfigList, ConfigSection, RootConfig
+
+_missing = object()
+
+
+def _stamp(value):
+    return '\0missing\0' if value is _missing else repr(value)
+
+
+def snapshot_config(config):
+    """
+    Copy the keys, values and operators of the sections of the config.
+    """
+    snapshot = OrderedDict()
+    for name, section in config._data.items():
+        data = OrderedDict()
+        for key, value in section._data.items():
+            if isinstance(value, ConfigList):
+                value = (list(value), value.allow_duplicate)
+            data[key] = value
+        snapshot[name] = (data, dict(section.operators))
+    return snapshot
+
+
+def diff_config(before, after):
+    """
+    Return the operations changing the `before` snapshot to the `after` one.
+
+    A list only appended to is an `extend` operation, which is replayed on
+    the current values; the other operations replace what they change.
+    """
+    operations = []
+    for name, (data, operators) in after.items():
+        existed = before.get(name, None)
+        if existed is None:
+            operations.append(('section', name, data, operators))
+            continue
+
+        existed_data, existed_operators = existed
+        existed_keys = [key for key in existed_data if key in data]
+        if len(existed_keys) != len(existed_data) or list(data)[:len(existed_keys)] != existed_keys:
+            # Some keys are deleted or moved.
+            operations.append(('section', name, data, operators))
+            continue
+
+        for key, value in data.items():
+            existed_value = existed_data.get(key, _missing)
+            if existed_value == value:
+                continue
+            if isinstance(value, tuple) and isinstance(existed_value, tuple) and value[1] == existed_value[1] \
+                    and value[0][:len(existed_value[0])] == existed_value[0]:
+                operations.append(('extend', name, key, value[0][len(existed_value[0]):]))
+            else:
+                operations.append(('set', name, key, value))
+
+        if operators != existed_operators:
+            operations.append(('operators', name, operators))
+
+    for name in before:
+        if name not in after:
+            operations.append(('delete', name))
+
+    return operations
+
+
+def _restore(value):
+    if isinstance(value, tuple):
+        values, allow_duplicate = value
+        value = ConfigList(values)
+        value.allow_duplicate = allow_duplicate
+    return value
+
+
+def apply_operations(config, operations):
+    """
+    Replay the operations of `diff_config` on the config.
+    """
+    for operation in operations:
+        kind, name = operation[0], operation[1]
+        if kind == 'delete':
+            config._data.pop(name, None)
+            continue
+
+        if kind == 'section':
+            _, _, data, operators = operation
+            section = config.section_class()
+            section.section = name
+            for key, value in data.items():
+                section._data[key] = _restore(value)
+            section.operators = dict(operators)
+            config._data[name] = section
+            continue
+
+        section = config[name]
+        if kind == 'set':
+            _, _, key, value = operation
+            section._data[key] = _restore(value)
+        elif kind == 'extend':
+            _, _, key, values = operation
+            section[key] = values
+        elif kind == 'operators':
+            section.operators = dict(operation[2])
+
+
+class HookRecord(object):
+    """
+    The recorded run of an option hook: the digest of its `source`, the
+    stamps of the values it read, its config `operations` and its `result`.
+    """
+    __slots__ = ('source', 'reads', 'operations', 'result')
+
+    def __init__(self, source, reads, operations, result):
+        self.source = source
+        self.reads = reads
+        self.operations = operations
+        self.result = result
+
+    def __repr__(self):
+        return '{class_name}(reads={reads}, operations={operations})'.format(
+            class_name=self.__class__.__name__,
+            reads=len(self.reads),
+            operations=len(self.operations),
+        )
+
+
+class HookTracker(object):
+    """
+    Record the reads of the running hook, against the snapshot of the config
+    before the hook.
+    """
+
+    def __init__(self):
+        self.reads = None
+        self.before = None
+
+    def start(self, before):
+        self.reads = OrderedDict()
+        self.before = before
+
+    def stop(self):
+        reads, self.reads, self.before = self.reads, None, None
+        return reads
+
+    def read(self, key, value):
+        reads = self.reads
+        if reads is not None and key not in reads:
+            reads[key] = _stamp(value)
+
+    def read_option(self, manifest_id, name, options):
+        if self.reads is not None:
+            self.read(('option', manifest_id, name), options.get(name, _missing))
+
+    def read_sections(self, name=None):
+        if self.reads is not None:
+            self.read(('sections', name), get_sections(self.before, name))
+
+    def read_section(self, name, key=None):
+        if self.reads is not None:
+            self.read(('section', name, key), get_section(self.before, name, key))
+
+
+def get_sections(snapshot, name=None):
+    return list(snapshot) if name is None else name in snapshot
+
+
+def get_section(snapshot, name, key=None):
+    section = snapshot.get(name, None)
+    if section is None:
+        return _missing
+    return section if key is None else section[0].get(key, _missing)
+
+
+class TrackedConfigSection(ConfigSection):
+    __slots__ = ('tracker',)
+
+    def __init__(self, *args, **kwargs):
+        self.tracker = None
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if self.tracker is not None:
+            self.tracker.read_section(self.section, key)
+        return super().__getitem__(key)
+
+    def __iter__(self):
+        if self.tracker is not None:
+            self.tracker.read_section(self.section)
+        return super().__iter__()
+
+    def __len__(self):
+        if self.tracker is not None:
+            self.tracker.read_section(self.section)
+        return super().__len__()
+
+
+class TrackedRootConfig(RootConfig):
+    """
+    The config of a component, recording the sections and keys its hooks
+    read.
+    """
+    __slots__ = ('tracker',)
+
+    section_class = TrackedConfigSection
+
+    def __init__(self, manifest, *args, **kwargs):
+        self.tracker = None
+        super().__init__(manifest, *args, **kwargs)
+
+    def __contains__(self, item):
+        if self.tracker is not None:
+            self.tracker.read_sections(item)
+        return super().__contains__(item)
+
+    def __getitem__(self, item):
+        section = super().__getitem__(item)
+        if isinstance(section, TrackedConfigSection):
+            section.tracker = self.tracker
+        return section
+
+    def __iter__(self):
+        if self.tracker is not None:
+            self.tracker.read_sections()
+        return super().__iter__()
+
+    def __len__(self):
+        if self.tracker is not None:
+            self.tracker.read_sections()
+        return super().__len__()
+
+    def detach(self):
+        self.tracker = None
+        for section in self._data.values():
+            if isinstance(section, TrackedConfigSection):
+                section.tracker = None
+
+
+class TrackedDefaults(MutableMapping):
+    """
+    The defaults of a component, recording the keys its hooks read. A hook
+    changing them is never reused.
+    """
+    __slots__ = ('data', 'tracker')
+
+    def __init__(self, data, tracker):
+        self.data = data
+        self.tracker = tracker
+
+    def __getitem__(self, key):
+        value = self.data.get(key, _missing)
+        self.tracker.read(('default', key), value)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.tracker.read(('volatile',), None)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        self.tracker.read(('volatile',), None)
+        del self.data[key]
+
+    def __iter__(self):
+        self.tracker.read(('defaults',), dict(self.data))
+        return iter(self.data)
+
+    def __len__(self):
+        self.tracker.read(('defaults',), dict(self.data))
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data)
+
+
+class ComponentTracker(object):
+    """
+    Run the option hooks of one component, or replay their records of the
+    last run: a record is reused while the source of the hook and every value
+    it read are unchanged.
+    """
+
+    def __init__(self, hook_cache, manifest):
+        self.hook_cache = hook_cache
+        self.manifest = manifest
+        self.records = hook_cache.load(manifest)
+        self.new_records = OrderedDict()
+        self.component_digest = hook_cache.get_component_digest(manifest)
+        self.tracker = HookTracker()
+        self.defaults = None
+
+    def attach(self, context):
+        """
+        Track the config, the defaults and the reads of the forked context.
+        """
+        config = TrackedRootConfig(context.manifest)
+        config.tracker = self.tracker
+        context.config = config
+        self.defaults = context.defaults
+        context.defaults = TrackedDefaults(self.defaults, self.tracker)
+        context.tracker = self.tracker
+
+    def detach(self, context):
+        context.config.detach()
+        context.defaults = self.defaults
+        context.tracker = None
+
+    def _get_current(self, key, context, snapshot):
+        kind = key[0]
+        if kind == 'default':
+            return self.defaults.get(key[1], _missing)
+        if kind == 'defaults':
+            return dict(self.defaults)
+        if kind == 'option':
+            return context.get_collected_option(key[1], key[2], _missing)
+        if kind == 'config':
+            return context.get_collected_config(key[1])
+        if kind == 'sections':
+            return get_sections(snapshot, key[1])
+        if kind == 'section':
+            return get_section(snapshot, key[1], key[2])
+        if kind == 'operators':
+            section = snapshot.get(key[1], None)
+            return section[1] if section is not None else _missing
+        # Never reused.
+        return object()
+
+    def is_fresh(self, record, context, snapshot):
+        for key, stamp in record.reads.items():
+            if _stamp(self._get_current(key, context, snapshot)) != stamp:
+                return False
+        return True
+
+    def _add_written(self, reads, operations, before):
+        # The operations but `extend` replace the values they change, they
+        # are stale when these values change.
+        for operation in operations:
+            kind, name = operation[0], operation[1]
+            if kind in ('section', 'delete'):
+                key = ('section', name, None)
+                value = get_section(before, name)
+            elif kind == 'set':
+                key = ('section', name, operation[2])
+                value = get_section(before, name, operation[2])
+            elif kind == 'operators':
+                key = ('operators', name)
+                section = before.get(name, None)
+                value = section[1] if section is not None else _missing
+            else:
+                continue
+            if key not in reads:
+                reads[key] = _stamp(value)
+
+    def run(self, option_name, context, run):
+        """
+        Return the result of the hook, `run` runs it.
+        """
+        source = self.hook_cache.get_source(self.component_digest, self.manifest, option_name)
+        before = snapshot_config(context.config)
+
+        record = self.records.get(option_name, None)
+        if record is not None and record.source == source and self.is_fresh(record, context, before):
+            try:
+                result = copy.deepcopy(record.result)
+            except Exception:
+                record = None
+            else:
+                apply_operations(context.config, record.operations)
+                self.new_records[option_name] = record
+                self.hook_cache.count(reused=1)
+                return result
+
+        self.tracker.start(before)
+        try:
+            result = run()
+        finally:
+            reads = self.tracker.stop()
+        self.hook_cache.count(ran=1)
+
+        try:
+            recorded_result = copy.deepcopy(result)
+        except Exception:
+            return result
+
+        operations = diff_config(before, snapshot_config(context.config))
+        self._add_written(reads, operations, before)
+        self.new_records[option_name] = HookRecord(source, reads, operations, recorded_result)
+        return result
+
+    def save(self):
+        self.hook_cache.save(self.manifest, self.new_records)
@@ -4,12 +4,17 @@
 # 
 # All rights reserved by Cd Chen.
 #
+import contextlib
+import itertools
+import os
 from collections import OrderedDict, MutableMapping, Mapping
 
 from buildout_component.errors import ImmutableValueError
 
 
 class SimpleMapping(MutableMapping):
+    __slots__ = ('_data', '__weakref__')
+
     def __init__(self, *args, **kwargs):
         self._data = OrderedDict(*args, **kwargs)
 
@@ -49,3 +54,66 @@ class ImmutableSimpleMapping(Mapping):
 
     def __delitem__(self, key):
         raise ImmutableValueError("The `{attr}` is immutable.".format(attr=key))
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# The umask is read once on import: `os.umask()` changes it for the whole
+# process, the other threads would create their files with the probe value.
+_UMASK = _get_umask()
+
+
+def is_same_file(path, other_path, ignore=None):
+    """
+    Compare two text files line by line, the parts of lines match the
+    `ignore` pattern are not compared.
+    """
+    with open(path, 'r') as fp, open(other_path, 'r') as other_fp:
+        for line, other_line in itertools.zip_longest(fp, other_fp):
+            if line is None or other_line is None:
+                return False
+            if ignore is not None:
+                line = ignore.sub('', line)
+                other_line = ignore.sub('', other_line)
+            if line != other_line:
+                return False
+    return True
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', keep_existing=None, **kwargs):
+    """
+    Write the file through a temporary file, then move it to `path`.
+
+    The `keep_existing` is called with `(path, temp_path)` after writing, the
+    existing file is kept if it returns True.
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory,
+        prefix='.{name}.'.format(name=os.path.basename(path)),
+        suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, mode, **kwargs) as fp:
+            yield fp
+        if keep_existing is not None and os.path.exists(path) and keep_existing(path, temp_path):
+            os.remove(temp_path)
+            return
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+INOTIFY_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+                     IN_CREATE | IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+IGNORED_DIR_NAMES = ('__pycache__',)
+IGNORED_FILE_SUFFIXES = ('.pyc', '.pyo', '.swp', '.swx', '~', '.tmp')
+
+
+def is_ignored(path):
+    names = path.split(os.sep)
+    if any(name in IGNORED_DIR_NAMES for name in names):
+        return True
+    return path.endswith(IGNORED_FILE_SUFFIXES)
+
+
+class BaseWatcher(object):
+    """
+    Watch the changes of files under a directory.
+    """
+
+    # Wait for the following events after the first one.
+    debounce = 0.1
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def wait(self, timeout=None):
+        """
+        Block until something changed, return the set of the changed paths.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PollingWatcher(BaseWatcher):
+    """
+    The watcher compares the mtime of the files periodically.
+    """
+
+    def __init__(self, path, interval=1.0):
+        super().__init__(path)
+        self.interval = interval
+        self.snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for dir_path, dir_names, file_names in os.walk(self.path):
+            dir_names[:] = [n for n in dir_names if n not in IGNORED_DIR_NAMES]
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                if is_ignored(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        return snapshot
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._take_snapshot()
+            changed = set(
+                path for path in set(snapshot) | set(self.snapshot)
+                if snapshot.get(path) != self.snapshot.get(path)
+            )
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval)
+
+
+class InotifyWatcher(BaseWatcher):
+    """
+    The watcher uses the Linux `inotify` API through `ctypes`.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+
+        library = ctypes.util.find_library('c')
+        if not library:
+            raise OSError("The C library is not found.")
+        self.libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("The `inotify` is not supported.")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fail.")
+
+        self.watches = {}
+        self._add_tree(self.path)
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), INOTIFY_WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    def _add_tree(self, path):
+        for dir_path, dir_names, _ in os.walk(path):
+            dir_names[:] = [n for n in dir_names if n not in IGNORED_DIR_NAMES]
+            self._add_watch(dir_path)
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            dir_path = self.watches.get(wd, None)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            if dir_path is None:
+                continue
+
+            path = os.path.join(dir_path, name) if name else dir_path
+            if is_ignored(path):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Watch the new directory and report the files in it.
+                self._add_tree(path)
+                for sub_dir_path, _, file_names in os.walk(path):
+                    changed.update(os.path.join(sub_dir_path, n) for n in file_names)
+            changed.add(path)
+
+        return set(path for path in changed if not is_ignored(path))
+
+    def wait(self, timeout=None):
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+
+        while readable:
+            changed.update(self._read_events())
+            readable, _, _ = select.select([self.fd], [], [], self.debounce)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_watcher(path, interval=1.0):
+    """
+    Return the `inotify` watcher where available, or the polling watcher.
+    """
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError):
+        return PollingWatcher(path, interval=interval)
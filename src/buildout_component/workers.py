@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+from buildout_component.builders import Builder, LEVEL_ERROR
+from buildout_component.contexts import Context
+from buildout_component.errors import HookError, HookTimeoutError
+from buildout_component.loaders import HookLoader
+
+# Workers are spawned, forking a process with running threads is not safe.
+START_METHOD = 'spawn'
+
+_MEGABYTE = 1024 * 1024
+
+
+def _set_memory_limit(memory_limit):
+    import resource
+
+    limit = int(memory_limit * _MEGABYTE)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _set_cpu_limit(cpu_limit):
+    """
+    Limit the CPU time of the next task, the worker is killed by `SIGXCPU`
+    when it is exceeded.
+    """
+    import resource
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_limit) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _get_exit_reason(exitcode):
+    if exitcode is not None and exitcode < 0:
+        import signal
+
+        try:
+            return "the worker was killed by {name}".format(name=signal.Signals(-exitcode).name)
+        except ValueError:
+            pass
+    return "the worker exited with code {code}".format(code=exitcode)
+
+
+class _WorkerBuilder(Builder):
+    """
+    The builder in the worker, tell the parent when every hook starts and
+    ends so the parent can time it and kill a hung one.
+    """
+
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+        self.option_name = None
+
+    def run_option(self, manifest, option_name, context, hook_loader, report, component_hooks=None):
+        self.option_name = option_name
+        self.conn.send(('start', option_name))
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            return super().run_option(manifest, option_name, context, hook_loader, report, component_hooks)
+        finally:
+            self.conn.send(('done', option_name, time.perf_counter() - start, time.process_time() - cpu_start))
+
+
+def _worker_main(conn, components_dir, cache_dir, memory_limit):
+    if memory_limit:
+        _set_memory_limit(memory_limit)
+
+    # The worker is a process of its own, import the hooks as `setup` does.
+    python_sys_path = os.path.dirname(os.path.abspath(components_dir))
+    if python_sys_path not in sys.path:
+        sys.path.insert(0, python_sys_path)
+
+    hook_loader = HookLoader(components_dir, cache_dir=cache_dir)
+    builder = _WorkerBuilder(conn)
+    conn.send(('ready',))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        manifest, defaults, collected, cpu_limit = task
+        if cpu_limit:
+            _set_cpu_limit(cpu_limit)
+
+        messages = []
+        context = Context()
+        context.collected.update(collected)
+        builder.option_name = None
+        try:
+            result = builder.setup_manifest(
+                manifest, context, hook_loader, defaults, lambda level, message: messages.append((level, message)))
+            conn.send(('result', result, messages))
+        except BaseException as exc:
+            if isinstance(exc, HookError) and exc.__cause__ is not None:
+                # The hook failed, it is reported in the messages already.
+                exc = exc.__cause__
+            conn.send(('error', builder.option_name, '{name}: {exc}'.format(
+                name=exc.__class__.__name__,
+                exc=exc,
+            ), traceback.format_exc(), messages))
+
+
+class _Worker(object):
+
+    def __init__(self, context, components_dir, cache_dir, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, components_dir, cache_dir, memory_limit),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self):
+        """
+        Wait until the worker started and imported its modules, so they are
+        not timed as the hooks. Return False if the worker exited instead.
+        """
+        if not self.ready:
+            try:
+                self.ready = self.conn.recv() == ('ready',)
+            except EOFError:
+                pass
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class HookWorkerPool(object):
+    """
+    Run the hooks of components in reusable worker processes.
+
+    A component is sent with the snapshot of the collected data it can read,
+    the worker returns the collected `config` and `options`. A hook running
+    longer than `timeout` seconds kills its worker, the `memory_limit` (in
+    MB) and the `cpu_limit` (in seconds of every component) are applied by
+    `resource` in the workers.
+    """
+
+    def __init__(self, components_dir, processes=1, cache_dir=None, timeout=None, memory_limit=None,
+                 cpu_limit=None, profiler=None):
+        self.components_dir = components_dir
+        self.processes = max(1, processes)
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self.profiler = profiler
+        self.context = multiprocessing.get_context(START_METHOD)
+        self.workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        return _Worker(self.context, self.components_dir, self.cache_dir, self.memory_limit)
+
+    def _acquire(self):
+        with self._lock:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self.workers) < self.processes:
+                worker = self._spawn()
+                self.workers.append(worker)
+                return worker
+        return self._idle.get()
+
+    def _release(self, worker, alive=True):
+        if not alive:
+            worker.kill()
+            with self._lock:
+                self.workers.remove(worker)
+                worker = self._spawn()
+                self.workers.append(worker)
+        self._idle.put(worker)
+
+    def _fail(self, manifest, option_name, message, report, error_class=HookError):
+        error = error_class(manifest.id, option_name, message)
+        report(LEVEL_ERROR, str(error))
+        raise error
+
+    def _get_timeout_message(self, option_name, running):
+        if running:
+            return "timed out after {timeout} seconds".format(timeout=self.timeout)
+        if option_name is None:
+            return "the component timed out after {timeout} seconds before its first hook started".format(
+                timeout=self.timeout
+            )
+        return "the component timed out after {timeout} seconds after the hook of `{option_name}` ended".format(
+            timeout=self.timeout,
+            option_name=option_name,
+        )
+
+    def setup_manifest(self, manifest, defaults, collected, report):
+        worker = self._acquire()
+        alive = False
+        try:
+            if not worker.wait_ready():
+                worker.process.join()
+                self._fail(manifest, None, _get_exit_reason(worker.process.exitcode), report)
+
+            worker.conn.send((manifest, defaults, collected, self.cpu_limit))
+            # The `timeout` is counted from the start of every hook, and out
+            # of the hooks, from the last message of the worker.
+            option_name, running, started = None, False, time.perf_counter()
+            while True:
+                if not worker.conn.poll(self.timeout):
+                    self._fail(
+                        manifest,
+                        option_name if running else None,
+                        self._get_timeout_message(option_name, running),
+                        report,
+                        HookTimeoutError,
+                    )
+                try:
+                    message = worker.conn.recv()
+                except EOFError:
+                    message = None
+                if message is None:
+                    worker.process.join()
+                    self._fail(
+                        manifest, option_name if running else None, _get_exit_reason(worker.process.exitcode), report)
+
+                kind = message[0]
+                if kind == 'start':
+                    option_name, running, started = message[1], True, time.perf_counter()
+                elif kind == 'done':
+                    running = False
+                    _, option_name, wall, cpu = message
+                    if self.profiler is not None:
+                        self.profiler.record(
+                            '{component}.{option_name}'.format(component=manifest.id, option_name=option_name),
+                            'hook', started, wall, cpu, pid=worker.process.pid,
+                        )
+                elif kind == 'result':
+                    alive = True
+                    _, result, messages = message
+                    for level, text in messages:
+                        report(level, text)
+                    return result
+                else:
+                    alive = True
+                    _, option_name, text, details, messages = message
+                    for level, message_text in messages:
+                        report(level, message_text)
+                    raise HookError(manifest.id, option_name, text, details)
+        finally:
+            self._release(worker, alive)
+
+    def close(self):
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
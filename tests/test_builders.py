@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from buildout_component.builders import Builder, Project, apply_extends
+from buildout_component.models import FinalRootConfig
+
+
+def write_component(components_dir, manifest, hooks):
+    component_dir = os.path.join(components_dir, manifest['id'])
+    os.makedirs(os.path.join(component_dir, 'hooks'))
+    with open(os.path.join(component_dir, 'manifest.json'), 'w') as fp:
+        json.dump(manifest, fp)
+    for option_name, source in hooks.items():
+        with open(os.path.join(component_dir, 'hooks', option_name + '.py'), 'w') as fp:
+            fp.write(source)
+
+
+class ApplyExtendsTestCase(unittest.TestCase):
+
+    def test_create_buildout_section(self):
+        config = FinalRootConfig()
+        apply_extends(config)
+        self.assertIn('buildout', config)
+
+    def test_without_extends_option(self):
+        config = FinalRootConfig()
+        apply_extends(config, ['base.cfg'], ['local.cfg'])
+        self.assertEqual(list(config['buildout']['extends']), ['base.cfg', 'local.cfg'])
+
+
+class BuilderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.project_root = tempfile.mkdtemp()
+        self.components_dir = os.path.join(self.project_root, 'buildout', 'components')
+        write_component(
+            self.components_dir,
+            {'id': 'plain', 'title': 'Plain', 'options': ['a'], 'defaults': {'a': '1'}},
+            {'a': 'def setup_option(context):\n    context.config["plain"]["a"] = "x"\n    return "x"\n'},
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.project_root)
+
+    def test_render_without_buildout_options(self):
+        builder = Builder()
+        result = builder.build(Project(self.project_root))
+        self.assertEqual(result.errors, [])
+        lines = result.render().splitlines()
+        self.assertIn('[buildout]', lines)
+        self.assertLess(lines.index('[buildout]'), lines.index('[plain]'))
+        self.assertEqual(result.options.get('plain.a'), 'x')
+
+    def test_build_in_running_loop(self):
+        async def main():
+            with Builder(hook_concurrency=2) as builder:
+                return builder.build(Project(self.project_root))
+
+        result = asyncio.run(main())
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.options.get('plain.a'), 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from buildout_component.bundles import close_bundles, get_bundle, pack_components, path_is_dir, read_file
+from buildout_component.index import ComponentIndex, load_manifest
+from buildout_component.loaders import HookLoader
+
+HOOK_SOURCE = """
+from .helpers import PREFIX
+
+
+def setup_option(context):
+    return PREFIX + {value!r}
+"""
+
+
+class BundleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.root, 'src')
+        self.components_dir = os.path.join(self.root, 'components')
+        self.bundle_path = os.path.join(self.components_dir, 'shared.zip')
+        os.makedirs(os.path.join(self.source_dir, 'demo', 'hooks'))
+        os.makedirs(self.components_dir)
+        with open(os.path.join(self.source_dir, 'demo', 'manifest.json'), 'w') as fp:
+            json.dump({'id': 'demo', 'options': ['port']}, fp)
+        with open(os.path.join(self.source_dir, 'demo', 'hooks', 'helpers.py'), 'w') as fp:
+            fp.write("PREFIX = 'port-'\n")
+        sys.path.insert(0, self.root)
+
+    def tearDown(self):
+        close_bundles()
+        sys.path.remove(self.root)
+        for name in list(sys.modules):
+            if name == 'components' or name.startswith('components.'):
+                del sys.modules[name]
+        shutil.rmtree(self.root)
+
+    def pack(self, value):
+        with open(os.path.join(self.source_dir, 'demo', 'hooks', 'port.py'), 'w') as fp:
+            fp.write(HOOK_SOURCE.format(value=value))
+        pack_components(self.source_dir, self.bundle_path)
+
+    def get_manifest(self):
+        index = ComponentIndex(self.components_dir, os.path.join(self.root, 'index.json'))
+        index.load()
+        (dir_name, entry), = index.scan()
+        return load_manifest(self.components_dir, dir_name, entry)
+
+    def test_pack_and_read(self):
+        self.pack('a')
+        self.assertTrue(path_is_dir(os.path.join(self.bundle_path, 'demo', 'hooks')))
+        path = os.path.join(self.bundle_path, 'demo', 'hooks', 'helpers.py')
+        self.assertEqual(read_file(path), b"PREFIX = 'port-'\n")
+
+        # The closed bundle is opened again by a read.
+        close_bundles()
+        self.assertIsNone(get_bundle(self.bundle_path).zip_file)
+        self.assertEqual(read_file(path), b"PREFIX = 'port-'\n")
+
+    def test_reload_changed_bundle(self):
+        self.pack('a')
+        manifest = self.get_manifest()
+        hook_loader = HookLoader(self.components_dir)
+        self.assertEqual(hook_loader.get_handler(manifest, 'port')(None), 'port-a')
+
+        # The rewritten bundle has a new stamp, even within the same mtime tick.
+        time.sleep(0.01)
+        self.pack('bb')
+        hook_loader.unload(manifest)
+        manifest = self.get_manifest()
+        self.assertEqual(hook_loader.get_handler(manifest, 'port')(None), 'port-bb')
+
+        module = hook_loader.load(manifest, 'port')
+        self.assertEqual(module.__file__, os.path.join(self.bundle_path, 'demo', 'hooks', 'port.py'))
+        hook_loader.unload(manifest)
+
+if __name__ == '__main__':
+    unittest.main()
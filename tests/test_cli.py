@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from buildout_component.cli import Command
+from buildout_component.stores import OptionStore, get_state_path
+
+# Written by the versions that pickled the options into `buildout.cfg`, the
+# options are `plain.a = 'x'`.
+LEGACY_OUTPUT = """# The buildout component configure file.
+# *** DO NOT EDIT THIS FILE, IT WILL GENERATE BY `buildout-component`
+# Create Time: 2020-01-02 03:04:05.000006
+[buildout]
+
+
+[versions]
+
+
+[plain]
+a = x
+
+
+[buildout_component]
+create_time = '2020-01-02 03:04:05.000006'
+options =     
+    gASVjwAAAAAAAACMGWJ1aWxkb3V0X2NvbXBvbmVudC5tb2RlbHOUjAdPcHRp
+    b25zlJOUKYGUfZQojAVfZGF0YZSMC2NvbGxlY3Rpb25zlIwLT3JkZXJlZERp
+    Y3SUk5QpUpSMB3BsYWluLmGUjAF4lHOMCV9ncm91cF9ieZRoCClSlIwFcGxh
+    aW6UaAgpUpSMAWGUaAtzc3ViLg==
+
+"""
+
+HOOK_SOURCE = """
+def setup_option(context):
+    context.config['plain']['a'] = context.defaults['a']
+    return context.defaults['a']
+"""
+
+
+class CommandTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.components_dir = os.path.join(self.root, 'components')
+        self.output_file = os.path.join(self.root, 'buildout.cfg')
+        component_dir = os.path.join(self.components_dir, 'plain')
+        os.makedirs(os.path.join(component_dir, 'hooks'))
+        with open(os.path.join(component_dir, 'manifest.json'), 'w') as fp:
+            json.dump({'id': 'plain', 'title': 'Plain', 'options': ['a'], 'defaults': {'a': '1'}}, fp)
+        with open(os.path.join(component_dir, 'hooks', 'a.py'), 'w') as fp:
+            fp.write(HOOK_SOURCE)
+        self.sys_path = list(sys.path)
+
+    def tearDown(self):
+        sys.path[:] = self.sys_path
+        for name in list(sys.modules):
+            if name == 'components' or name.startswith('components.'):
+                del sys.modules[name]
+        shutil.rmtree(self.root)
+
+    def execute(self, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            Command().execute(list(args) + [
+                '-c', self.components_dir, '-o', self.output_file,
+                '--cache-dir', os.path.join(self.root, 'cache'),
+            ])
+        return stdout.getvalue()
+
+    def test_migrate_legacy_options(self):
+        with open(self.output_file, 'w') as fp:
+            fp.write(LEGACY_OUTPUT)
+
+        self.assertIn("plain.a='x'", self.execute('show-options'))
+
+        self.execute('setup', '-f')
+        store = OptionStore(get_state_path(self.output_file))
+        self.assertTrue(store.exists())
+        self.assertEqual(store.get('plain', 'a'), 'x')
+        with open(self.output_file) as fp:
+            output = fp.read()
+        self.assertIn('[plain]\na = x\n', output)
+        self.assertNotIn('options =', output)
+
+    def test_show_options_of_fresh_project(self):
+        self.assertEqual(self.execute('show-options'), '')
+        # The state file is created by a write, read it before the tables exist.
+        open(get_state_path(self.output_file), 'w').close()
+        self.assertEqual(self.execute('show-options'), '')
+        self.assertEqual(self.execute('show-options', 'plain.a'), "plain.a=None\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import asyncio
+import unittest
+from collections import OrderedDict
+
+from buildout_component.executors import AsyncioExecutor, SerialExecutor
+from buildout_component.graph import DependencyGraph
+from buildout_component.models import Manifest
+
+
+def create_graph():
+    return DependencyGraph(OrderedDict(
+        (manifest_id, Manifest(id=manifest_id, dependencies=dependencies))
+        for manifest_id, dependencies in (('web', ['db', 'cache']), ('db', []), ('cache', []))
+    ))
+
+
+class AsyncioExecutorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+
+    async def setup_async(self, manifest):
+        self.started.append(manifest.id)
+        await asyncio.sleep(0)
+        return manifest.id.upper()
+
+    def execute(self):
+        return AsyncioExecutor(self.setup_async, 2).execute(create_graph(), OrderedDict())
+
+    def test_execute(self):
+        self.assertEqual(list(self.execute().items()), [('db', 'DB'), ('cache', 'CACHE'), ('web', 'WEB')])
+        self.assertEqual(self.started[-1], 'web')
+
+    def test_execute_in_running_loop(self):
+        async def main():
+            return self.execute()
+
+        self.assertEqual(list(asyncio.run(main()).items()), [('db', 'DB'), ('cache', 'CACHE'), ('web', 'WEB')])
+
+
+class SerialExecutorTestCase(unittest.TestCase):
+
+    def test_execute(self):
+        collected = SerialExecutor(lambda manifest: manifest.id).execute(create_graph(), OrderedDict())
+        self.assertEqual(list(collected), ['db', 'cache', 'web'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import unittest
+from collections import OrderedDict
+
+from buildout_component.errors import CyclicDependencyError
+from buildout_component.graph import DependencyGraph
+from buildout_component.models import Manifest
+
+
+def create_graph(*items):
+    return DependencyGraph(OrderedDict(
+        (manifest_id, Manifest(id=manifest_id, dependencies=dependencies)) for manifest_id, dependencies in items
+    ))
+
+
+class DependencyGraphTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = create_graph(
+            ('web', ['app', 'cache']),
+            ('app', ['db']),
+            ('db', []),
+            ('cache', ['missing']),
+            ('worker', ['db']),
+        )
+
+    def test_topological_order(self):
+        self.assertEqual(self.graph.topological_order(), ['db', 'app', 'cache', 'web', 'worker'])
+        self.assertEqual(self.graph.missing_dependencies, [['web', 'cache', 'missing']])
+        self.assertEqual(self.graph.levels(), [['db', 'cache'], ['app', 'worker'], ['web']])
+
+    def test_closure(self):
+        self.assertEqual(self.graph.get_closure(['web']), ['db', 'app', 'cache', 'web'])
+        self.assertEqual(self.graph.get_closure(['worker', 'cache']), ['db', 'cache', 'worker'])
+        self.assertEqual(self.graph.get_closure(['missing']), [])
+
+    def test_dependents(self):
+        self.assertEqual(self.graph.get_dependents(['db']), ['db', 'app', 'web', 'worker'])
+        self.assertEqual(self.graph.get_dependents(['cache']), ['cache', 'web'])
+
+    def test_cyclic_dependency(self):
+        graph = create_graph(('a', ['b']), ('b', ['c']), ('c', ['a']))
+        with self.assertRaises(CyclicDependencyError) as cm:
+            graph.topological_order()
+        self.assertEqual(cm.exception.path, ['a', 'b', 'c', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from buildout_component.loaders import BYTECODE_CACHE_DIR_NAME, HookLoader
+from buildout_component.models import Manifest
+
+HOOKS_PACKAGE_SOURCE = """
+from .helpers import VALUE
+
+
+def setup_b(context):
+    return VALUE
+"""
+
+HOOKS_MODULE_SOURCE = """
+def setup_b(context):
+    return 'module'
+"""
+
+OPTION_HOOK_SOURCE = """
+def setup_option(context):
+    return 'option'
+"""
+
+
+def write_file(path, source):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        fp.write(source)
+
+
+def find_compiled(path):
+    return sorted(
+        os.path.join(root, name)
+        for root, dirs, files in os.walk(path) for name in files if name.endswith('.pyc')
+    )
+
+
+class HookLoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.components_dir = os.path.join(self.root, 'components')
+        self.cache_dir = os.path.join(self.root, 'cache')
+        self.component_dir = os.path.join(self.components_dir, 'app')
+        write_file(os.path.join(self.component_dir, 'hooks', 'a.py'), OPTION_HOOK_SOURCE)
+        self.manifest = Manifest(id='app', options=['a', 'b'], component_dir='app')
+        sys.path.insert(0, self.root)
+        # The import system writes the `__pycache__` directories the loader removes.
+        self.dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+
+    def tearDown(self):
+        sys.dont_write_bytecode = self.dont_write_bytecode
+        sys.path.remove(self.root)
+        for name in list(sys.modules):
+            if name == 'components' or name.startswith('components.'):
+                del sys.modules[name]
+        shutil.rmtree(self.root)
+
+    def load(self, hook_loader):
+        component_module = hook_loader.load_component(self.manifest)
+        results = [
+            hook_loader.get_handler(self.manifest, option_name, component_module)(None)
+            for option_name in self.manifest.options
+        ]
+        hook_loader.cleanup(self.manifest)
+        return results
+
+    def write_hooks_package(self):
+        write_file(os.path.join(self.component_dir, 'hooks', '__init__.py'), HOOKS_PACKAGE_SOURCE)
+        write_file(os.path.join(self.component_dir, 'hooks', 'helpers.py'), "VALUE = 'package'\n")
+
+    def test_hooks_package(self):
+        self.write_hooks_package()
+        self.assertEqual(self.load(HookLoader(self.components_dir)), ['option', 'package'])
+        self.assertEqual(find_compiled(self.component_dir), [])
+
+    def test_cached_hooks_package(self):
+        self.write_hooks_package()
+        self.assertEqual(self.load(HookLoader(self.components_dir, self.cache_dir)), ['option', 'package'])
+        self.assertEqual(find_compiled(self.component_dir), [])
+        self.assertEqual(
+            sorted(name.split('.')[0] for name in os.listdir(
+                os.path.join(self.cache_dir, BYTECODE_CACHE_DIR_NAME, 'app'))),
+            ['__init__', 'a'],
+        )
+
+    def test_hooks_module(self):
+        write_file(os.path.join(self.component_dir, 'hooks.py'), HOOKS_MODULE_SOURCE)
+        self.assertEqual(self.load(HookLoader(self.components_dir)), ['option', 'module'])
+        self.assertEqual(find_compiled(self.component_dir), [])
+
+    def test_cached_hooks_module(self):
+        write_file(os.path.join(self.component_dir, 'hooks.py'), HOOKS_MODULE_SOURCE)
+        self.assertEqual(self.load(HookLoader(self.components_dir, self.cache_dir)), ['option', 'module'])
+        self.assertEqual(find_compiled(self.component_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
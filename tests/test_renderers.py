@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import unittest
+
+from buildout_component.models import ConfigSection, FinalRootConfig
+from buildout_component.renderers import ConfigRenderer
+
+# Rendered by the `FinalRootConfig.render()` of the `cli` module before the
+# `renderers` module, from the config of `create_config()`.
+NO_VERSIONS_OUTPUT = (
+    "[buildout]\n"
+    "parts += app\n"
+    "\n"
+    "\n"
+    "[versions]\n"
+    "\n"
+    "\n"
+    "[app]\n"
+    "recipe = zc.recipe.egg\n"
+    "eggs =     \n"
+    "    foo\n"
+    "    bar\n"
+    "\n"
+    "\n"
+    "[buildout_component]\n"
+    "state = buildout.cfg.options.db\n"
+    "\n"
+)
+
+NO_BUILDOUT_OUTPUT = (
+    "[buildout]\n"
+    "\n"
+    "\n"
+    "[versions]\n"
+    "\n"
+    "\n"
+    "[plain]\n"
+    "a = x\n"
+    "\n"
+    "\n"
+    "[buildout_component]\n"
+    "\n"
+)
+
+
+def create_config(sections):
+    config = FinalRootConfig()
+    for name, options in sections:
+        section = ConfigSection()
+        for key, value in options:
+            section[key] = value
+        config[name] = section
+    return config
+
+
+class ConfigRendererTestCase(unittest.TestCase):
+
+    def test_render_without_versions(self):
+        config = create_config([
+            ('buildout', [('parts', ['app'])]),
+            ('app', [('recipe', 'zc.recipe.egg'), ('eggs', ['foo', 'bar'])]),
+            ('buildout_component', [('state', 'buildout.cfg.options.db')]),
+        ])
+        self.assertEqual(ConfigRenderer().render(config), NO_VERSIONS_OUTPUT)
+
+    def test_render_empty_first_sections(self):
+        config = create_config([
+            ('plain', [('a', 'x')]),
+        ])
+        self.assertEqual(ConfigRenderer().render(config), NO_BUILDOUT_OUTPUT)
+        self.assertNotIn('buildout', config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import datetime
+import decimal
+import fractions
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from buildout_component.models import Options
+from buildout_component.stores import OptionStore, TYPE_KEY, decode_value, encode_value
+
+
+def round_trip(value):
+    return decode_value(json.loads(json.dumps(encode_value(value))))
+
+
+class EncodeValueTestCase(unittest.TestCase):
+
+    def assert_round_trip(self, value, type_name=None):
+        data = encode_value(value)
+        if type_name is not None:
+            self.assertEqual(data[TYPE_KEY], type_name)
+        result = round_trip(value)
+        self.assertEqual(result, value)
+        self.assertIs(type(result), type(value))
+
+    def test_json_types(self):
+        for value in (None, True, 1, 1.5, 'text', [1, 'a', None], {'a': [1, 2], 'b': {'c': 'd'}}):
+            self.assert_round_trip(value)
+
+    def test_tagged_types(self):
+        self.assert_round_trip((1, 'a', (2, 3)), 'tuple')
+        self.assert_round_trip({1, 2, 3}, 'set')
+        self.assert_round_trip(frozenset(['a', 'b']), 'frozenset')
+        self.assert_round_trip({1: 'a', (2, 3): 'b'}, 'dict')
+        self.assert_round_trip({TYPE_KEY: 'tuple', 'value': [1]}, 'dict')
+        self.assert_round_trip(datetime.datetime(2020, 1, 2, 3, 4, 5, 6), 'datetime')
+        self.assert_round_trip(datetime.date(2020, 1, 2), 'date')
+        self.assert_round_trip(datetime.time(3, 4, 5, 6), 'time')
+        self.assert_round_trip(datetime.timedelta(days=1, seconds=2, microseconds=3), 'timedelta')
+        self.assert_round_trip(decimal.Decimal('1.10'), 'decimal')
+        self.assert_round_trip(b'\x00\xffdata', 'bytes')
+
+    def test_nested_tagged_types(self):
+        self.assert_round_trip([(1, 2), {'a': {b'x'}}])
+
+    def test_pickle_fallback(self):
+        self.assert_round_trip(fractions.Fraction(1, 3), 'pickle')
+        self.assert_round_trip({1: fractions.Fraction(1, 2)}, 'dict')
+
+    def test_unpicklable_value(self):
+        with self.assertRaises(TypeError):
+            encode_value(lambda: None)
+
+    def test_old_repr_value(self):
+        self.assertEqual(decode_value({TYPE_KEY: 'repr', 'value': 'Fraction(1, 3)'}), 'Fraction(1, 3)')
+
+
+class OptionStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = OptionStore(os.path.join(self.root, 'buildout.cfg.options.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_save_and_load(self):
+        options = Options()
+        options.put('db', 'port', 5432)
+        options.put('db', 'hosts', ('a', 'b'))
+        options.put('web', 'started', datetime.date(2020, 1, 2))
+
+        self.assertTrue(self.store.save(options))
+        self.assertFalse(self.store.save(options))
+        self.assertEqual(self.store.load().group_by, options.group_by)
+        self.assertEqual(self.store.get('db', 'hosts'), ('a', 'b'))
+        self.assertEqual(self.store.get('db', 'missing', 'default'), 'default')
+        self.assertEqual(list(self.store.get_component('db').items()), [('port', 5432), ('hosts', ('a', 'b'))])
+
+    def test_missing_file(self):
+        self.assertEqual(self.store.load().group_by, {})
+        self.assertEqual(self.store.get('db', 'port', 'default'), 'default')
+        self.assertFalse(self.store.exists())
+
+    def test_empty_file(self):
+        open(self.store.path, 'w').close()
+        self.assertEqual(self.store.load().group_by, {})
+        self.assertEqual(self.store.get('db', 'port', 'default'), 'default')
+        self.assertEqual(self.store.get_component('db'), OrderedDict())
+        self.assertEqual(self.store.load_configs({}), OrderedDict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from buildout_component.builders import Builder
+from buildout_component.caches import HookCache
+from buildout_component.contexts import Context
+from buildout_component.loaders import IsolatedHookLoader
+from buildout_component.models import Manifest
+
+COMPONENTS = [
+    ({'id': 'db', 'options': ['port', 'host'], 'defaults': {'port': '5432', 'host': 'localhost'}}, {
+        'port': """
+def setup_option(context):
+    context.config['db']['recipe'] = 'db.recipe'
+    return context.defaults['port']
+""",
+        'host': """
+def setup_option(context):
+    return context.defaults['host']
+""",
+    }),
+    ({'id': 'web', 'options': ['url', 'name'], 'dependencies': ['db']}, {
+        'url': """
+def setup_option(context):
+    return 'http://localhost:{port}'.format(port=context.get_collected_option('db', 'port'))
+""",
+        'name': """
+def setup_option(context):
+    context.config['web']['name'] = 'web'
+    return 'web'
+""",
+    }),
+]
+
+
+class ComponentTrackerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.components_dir = os.path.join(self.root, 'components')
+        self.manifests = []
+        for data, hooks in COMPONENTS:
+            component_dir = os.path.join(self.components_dir, data['id'])
+            os.makedirs(os.path.join(component_dir, 'hooks'))
+            manifest_path = os.path.join(component_dir, 'manifest.json')
+            with open(manifest_path, 'w') as fp:
+                json.dump(data, fp)
+            for option_name, source in hooks.items():
+                self.write_hook(data['id'], option_name, source)
+            self.manifests.append(Manifest(
+                component_dir=data['id'], manifest_path=manifest_path, hooks_dir_existed=True, **data))
+        self.hook_loader = IsolatedHookLoader(self.components_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, component, option_name, source):
+        with open(os.path.join(self.components_dir, component, 'hooks', option_name + '.py'), 'w') as fp:
+            fp.write(source)
+
+    def build(self, **defaults):
+        """
+        Run the components with the `<component>.<name>` defaults, return the
+        hook cache with the counts and the collected data.
+        """
+        builder = Builder()
+        hook_cache = HookCache(os.path.join(self.root, 'cache'), self.hook_loader)
+        context = Context()
+        for manifest in self.manifests:
+            manifest_defaults = dict(manifest.defaults)
+            for key, value in defaults.items():
+                component, _, name = key.partition('_')
+                if component == manifest.id:
+                    manifest_defaults[name] = value
+            context.collected[manifest.id] = builder.setup_manifest(
+                manifest, context, self.hook_loader, manifest_defaults, self.report, hook_cache=hook_cache)
+        return hook_cache, context.collected
+
+    def report(self, level, message):
+        self.fail(message)
+
+    def assert_counts(self, hook_cache, ran, reused):
+        self.assertEqual((hook_cache.ran, hook_cache.reused), (ran, reused))
+
+    def test_replay_unchanged(self):
+        hook_cache, collected = self.build()
+        self.assert_counts(hook_cache, 4, 0)
+
+        hook_cache, replayed = self.build()
+        self.assert_counts(hook_cache, 0, 4)
+        self.assertEqual(replayed['web']['options'], collected['web']['options'])
+        self.assertEqual(list(replayed['db']['config']['db']['recipe']), ['db.recipe'])
+        self.assertEqual(list(replayed['web']['config']['web']['name']), ['web'])
+
+    def test_rerun_changed_input(self):
+        self.build()
+
+        # The `db.port` hook reads the changed default, the `web.url` hook
+        # reads the changed `db.port` option.
+        hook_cache, collected = self.build(db_port='6543')
+        self.assert_counts(hook_cache, 2, 2)
+        self.assertEqual(collected['db']['options']['port'], '6543')
+        self.assertEqual(collected['web']['options']['url'], 'http://localhost:6543')
+
+    def test_keep_unrelated_change(self):
+        self.build()
+
+        # Only the `db.host` hook reads the host.
+        hook_cache, collected = self.build(db_host='db.local')
+        self.assert_counts(hook_cache, 1, 3)
+        self.assertEqual(collected['db']['options']['host'], 'db.local')
+        self.assertEqual(collected['web']['options']['url'], 'http://localhost:5432')
+
+    def test_rerun_changed_source(self):
+        self.build()
+
+        self.write_hook('web', 'name', "def setup_option(context):\n    return 'site'\n")
+        hook_cache, collected = self.build()
+        self.assert_counts(hook_cache, 1, 3)
+        self.assertEqual(collected['web']['options']['name'], 'site')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from buildout_component.utils import atomic_write
+
+
+class AtomicWriteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'buildout.cfg')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def get_mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_new_file_mode(self):
+        umask = os.umask(0o077)
+        try:
+            with atomic_write(self.path) as fp:
+                fp.write('[buildout]\n')
+            # The write does not change the umask of the process.
+            self.assertEqual(os.umask(0o077), 0o077)
+        finally:
+            os.umask(umask)
+        # The mode follows the umask read on import, as `open()` would then.
+        self.assertEqual(self.get_mode(), 0o666 & ~umask)
+
+    def test_keep_existing_mode(self):
+        with open(self.path, 'w') as fp:
+            fp.write('[buildout]\n')
+        os.chmod(self.path, 0o600)
+        with atomic_write(self.path) as fp:
+            fp.write('[versions]\n')
+        self.assertEqual(self.get_mode(), 0o600)
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), '[versions]\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
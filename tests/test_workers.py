@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Buildout Component
+#
+# All rights reserved by Cd Chen.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from buildout_component.errors import HookError, HookTimeoutError
+from buildout_component.models import Manifest
+from buildout_component.workers import HookWorkerPool
+
+HOOK_SOURCES = {
+    'fast': """
+def setup_option(context):
+    return 'fast'
+""",
+    'sleep': """
+import time
+
+
+def setup_option(context):
+    time.sleep(60)
+""",
+    'memory': """
+def setup_option(context):
+    return len(bytearray(1024 * 1024 * 1024))
+""",
+    'cpu': """
+def setup_option(context):
+    while True:
+        pass
+""",
+}
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "The limits of the workers are tested on Linux.")
+class HookWorkerPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.components_dir = os.path.join(self.root, 'components')
+        for component, source in HOOK_SOURCES.items():
+            hooks_dir = os.path.join(self.components_dir, component, 'hooks')
+            os.makedirs(hooks_dir)
+            with open(os.path.join(hooks_dir, 'a.py'), 'w') as fp:
+                fp.write(source)
+        self.messages = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def report(self, level, message):
+        self.messages.append((level, message))
+
+    def setup_manifest(self, pool, component):
+        manifest = Manifest(id=component, options=['a'], component_dir=component, hooks_dir_existed=True)
+        return pool.setup_manifest(manifest, {}, {}, self.report)
+
+    def assert_failed(self, pool, component, error_class, text):
+        with self.assertRaises(error_class) as cm:
+            self.setup_manifest(pool, component)
+        self.assertEqual(cm.exception.option_name, 'a')
+        self.assertIn(text, str(cm.exception))
+        self.assertIn('`{component}.a`'.format(component=component), self.messages[-1][1])
+        self.assertEqual(self.messages[-1][0], 'error')
+
+        # The failure is contained in the worker, the pool still runs hooks.
+        result = self.setup_manifest(pool, 'fast')
+        self.assertEqual(result['options'].get('a'), 'fast')
+
+    def test_timeout(self):
+        with HookWorkerPool(self.components_dir, timeout=0.5) as pool:
+            self.assert_failed(pool, 'sleep', HookTimeoutError, 'timed out after 0.5 seconds')
+
+    def test_memory_limit(self):
+        with HookWorkerPool(self.components_dir, memory_limit=256) as pool:
+            self.assert_failed(pool, 'memory', HookError, 'MemoryError')
+
+    def test_cpu_limit(self):
+        with HookWorkerPool(self.components_dir, timeout=30, cpu_limit=1) as pool:
+            self.assert_failed(pool, 'cpu', HookError, 'killed by SIGXCPU')
+
+
+if __name__ == '__main__':
+    unittest.main()